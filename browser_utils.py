@@ -1,9 +1,12 @@
 import os
 import time
 import shutil
+import ctypes
 import subprocess
+from ctypes import wintypes
 from pathlib import Path
 from typing import Optional
+from functools import lru_cache
 from selenium import webdriver
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
@@ -11,47 +14,145 @@ from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.edge.options import Options as EdgeOptions
 from selenium.webdriver.edge.service import Service as EdgeService
 
-from common import read_browser_path, log_debug
+from common import read_browser_path, log_debug, env_flag
 from sku_utils import SKU_ITEM_SELECTOR
 
 # 浏览器与驱动管理工具
 
+# Win32 Toolhelp 快照相关常量与结构体（用于直接枚举进程，避免每次启动 tasklist.exe）
+TH32CS_SNAPPROCESS = 0x00000002
+INVALID_HANDLE_VALUE = ctypes.c_void_p(-1).value
+SYNCHRONIZE = 0x00100000
+PROCESS_TERMINATE = 0x0001
+MAXIMUM_WAIT_OBJECTS = 64
 
-def is_process_running(image_name: str) -> bool:
-    """使用 Windows 'tasklist' 命令检查给定进程名是否在运行。"""
+# 异步脚本超时（ms），需大于 open_product_page 的最长等待
+SCRIPT_TIMEOUT_MS = 60000
+
+# 页面内等待选择器出现：已存在立即返回，否则监听 DOM 变化，出现即返回 true，超时返回 false
+# 参数：选择器、最长等待(ms)
+_WAIT_FOR_SELECTOR_JS = (
+    "var done = arguments[arguments.length - 1], sel = arguments[0], timeoutMs = arguments[1];\n"
+    "if (document.querySelector(sel)) { done(true); return; }\n"
+    "var mo = null, timer = null;\n"
+    "function finish(v){ if (mo) mo.disconnect(); clearTimeout(timer); done(v); }\n"
+    "try{\n"
+    "  mo = new MutationObserver(function(){ if (document.querySelector(sel)) finish(true); });\n"
+    "  mo.observe(document.documentElement, {childList: true, subtree: true});\n"
+    "}catch(e){ mo = null; }\n"
+    "timer = setTimeout(function(){ finish(!!document.querySelector(sel)); }, timeoutMs);"
+)
+
+# Edge / EdgeDriver 相关进程名
+EDGE_IMAGES = ("msedge.exe", "msedgewebview2.exe")
+DRIVER_IMAGES = ("msedgedriver.exe",)
+
+
+class _PROCESSENTRY32W(ctypes.Structure):
+    _fields_ = [
+        ("dwSize", wintypes.DWORD),
+        ("cntUsage", wintypes.DWORD),
+        ("th32ProcessID", wintypes.DWORD),
+        ("th32DefaultHeapID", ctypes.c_size_t),
+        ("th32ModuleID", wintypes.DWORD),
+        ("cntThreads", wintypes.DWORD),
+        ("th32ParentProcessID", wintypes.DWORD),
+        ("pcPriClassBase", ctypes.c_long),
+        ("dwFlags", wintypes.DWORD),
+        ("szExeFile", ctypes.c_wchar * 260),
+    ]
+
+
+def _snapshot_processes() -> list[tuple[str, int]]:
+    """通过 Toolhelp 快照（CreateToolhelp32Snapshot）一次性枚举当前所有进程，返回 (进程名小写, PID) 列表。
+    单次系统调用即可拿到完整进程表；非 Windows 或调用失败时返回空列表。
+    """
+    procs: list[tuple[str, int]] = []
     try:
-        result = subprocess.run(
-            ["tasklist", "/FI", f"IMAGENAME eq {image_name}"],
-            capture_output=True,
-            text=True,
-            check=False,
-        )
-        stdout = (result.stdout or "").lower()
-        return image_name.lower() in stdout
+        kernel32 = ctypes.windll.kernel32
+        kernel32.CreateToolhelp32Snapshot.restype = wintypes.HANDLE
+        snap = kernel32.CreateToolhelp32Snapshot(TH32CS_SNAPPROCESS, 0)
+        if not snap or snap == INVALID_HANDLE_VALUE:
+            return procs
+        try:
+            entry = _PROCESSENTRY32W()
+            entry.dwSize = ctypes.sizeof(_PROCESSENTRY32W)
+            ok = kernel32.Process32FirstW(wintypes.HANDLE(snap), ctypes.byref(entry))
+            while ok:
+                procs.append((entry.szExeFile.lower(), int(entry.th32ProcessID)))
+                ok = kernel32.Process32NextW(wintypes.HANDLE(snap), ctypes.byref(entry))
+        finally:
+            kernel32.CloseHandle(wintypes.HANDLE(snap))
     except Exception:
-        return False
+        pass
+    return procs
+
 
+def _wait_handles(kernel32, handles: list, timeout_ms: int) -> None:
+    """等待一组进程句柄全部变为有信号（进程退出即被内核唤醒，无需轮询）。
+    单次 WaitForMultipleObjects 最多 64 个句柄，超出时分批等待并共享同一截止时间。
+    """
+    deadline = time.perf_counter() + timeout_ms / 1000.0
+    for i in range(0, len(handles), MAXIMUM_WAIT_OBJECTS):
+        batch = handles[i:i + MAXIMUM_WAIT_OBJECTS]
+        remain_ms = max(0, int((deadline - time.perf_counter()) * 1000))
+        arr = (wintypes.HANDLE * len(batch))(*batch)
+        kernel32.WaitForMultipleObjects(len(batch), arr, True, remain_ms)
 
-def kill_edge_processes() -> None:
-    """强制结束 Edge 相关进程（msedge.exe、msedgewebview2.exe）。"""
-    for image in ("msedge.exe", "msedgewebview2.exe"):
+
+def _terminate_processes(image_names: tuple[str, ...], wait_ms: int = 0) -> int:
+    """基于一次 Toolhelp 快照，对匹配进程名的 PID 直接调用 TerminateProcess 强制结束，返回结束的进程数。
+    wait_ms > 0 时，先对全部进程发起结束，再用同一批句柄一次性等待它们退出（超时即返回）。
+    ctypes/Win32 不可用时回退为单次 taskkill 调用（多个 /IM 合并）。
+    """
+    targets = {n.lower() for n in image_names}
+    try:
+        kernel32 = ctypes.windll.kernel32
+    except Exception:
+        args = ["taskkill", "/F"]
+        for image in image_names:
+            args += ["/IM", image]
         try:
-            subprocess.run(["taskkill", "/IM", image, "/F"], capture_output=True, text=True)
+            subprocess.run(args, capture_output=True, text=True)
         except Exception:
             pass
+        return 0
+    kernel32.OpenProcess.restype = wintypes.HANDLE
+    handles = []
+    try:
+        for name, pid in _snapshot_processes():
+            if name not in targets:
+                continue
+            h = kernel32.OpenProcess(PROCESS_TERMINATE | SYNCHRONIZE, False, pid)
+            if h:
+                handles.append(h)
+                kernel32.TerminateProcess(wintypes.HANDLE(h), 1)
+        if wait_ms > 0 and handles:
+            _wait_handles(kernel32, handles, wait_ms)
+    except Exception:
+        pass
+    finally:
+        for h in handles:
+            try:
+                kernel32.CloseHandle(wintypes.HANDLE(h))
+            except Exception:
+                pass
+    return len(handles)
 
 
 def kill_driver_processes() -> None:
     """强制结束 EdgeDriver 相关进程（msedgedriver.exe）。"""
-    for image in ("msedgedriver.exe",):
-        try:
-            subprocess.run(["taskkill", "/IM", image, "/F"], capture_output=True, text=True)
-        except Exception:
-            pass
+    _terminate_processes(DRIVER_IMAGES)
+
 
+def kill_all_edge_related(wait_ms: int = 0) -> int:
+    """一次快照内同时结束 Edge 与 EdgeDriver 相关进程；wait_ms > 0 时等待它们全部退出。返回结束的进程数。"""
+    return _terminate_processes(EDGE_IMAGES + DRIVER_IMAGES, wait_ms)
 
+
+@lru_cache(maxsize=1)
 def find_msedgedriver_path() -> Optional[str]:
-    """查找 msedgedriver.exe 的本地路径（避免联网下载）。
+    """查找 msedgedriver.exe 的本地路径（避免联网下载；进程内只查找一次并缓存结果）。
     查找顺序：
       1) 环境变量 MSEDGEDRIVER 指定的路径
       2) 项目根目录下的 driver/msedgedriver.exe
@@ -99,21 +200,12 @@ def find_msedgedriver_path() -> Optional[str]:
 
 def prepare_clean_edge_state() -> None:
     """准备干净的 Edge 运行环境，确保不受残留进程影响。"""
-    print("[步骤] 检查并关闭现有的 Edge 进程...")
-    t_all0 = time.perf_counter()
-    if is_process_running("msedge.exe"):
-        print("[信息] 检测到 Edge 正在运行，关闭所有 Edge 相关进程...")
-        t0 = time.perf_counter()
-        kill_edge_processes()
-        while time.perf_counter() - t0 < 1.0:
-            if not is_process_running("msedge.exe"):
-                break
-            time.sleep(0.1)
-        log_debug(f"关闭 Edge 进程总耗时 {(time.perf_counter() - t0)*1000:.0f}ms")
-    print("[步骤] 关闭可能残留的 EdgeDriver 进程...")
-    t1 = time.perf_counter()
-    kill_driver_processes()
-    log_debug(f"关闭 EdgeDriver 进程耗时 {(time.perf_counter() - t1)*1000:.0f}ms；清理总耗时 {(time.perf_counter() - t_all0):.3f}s")
+    print("[步骤] 检查并关闭现有的 Edge 及残留的 EdgeDriver 进程...")
+    t0 = time.perf_counter()
+    killed = kill_all_edge_related(wait_ms=1000)
+    if killed:
+        print(f"[信息] 已关闭 {killed} 个 Edge/EdgeDriver 相关进程")
+    log_debug(f"结束并等待 Edge/EdgeDriver 进程退出，清理总耗时 {(time.perf_counter() - t0):.3f}s")
 
 
 def init_edge_driver() -> webdriver.Edge:
@@ -134,10 +226,22 @@ def init_edge_driver() -> webdriver.Edge:
     options.add_argument("--disable-quic")
     options.add_argument("--ignore-certificate-errors")
     options.set_capability("acceptInsecureCerts", True)
+    # 可选：禁止加载图片以加快页面就绪（DISABLE_IMAGES=1 开启）。
+    # 仅使用命令行开关，不写入 prefs，避免改动用户 Edge 配置文件中的图片设置。
+    if env_flag("DISABLE_IMAGES"):
+        options.add_argument("--blink-settings=imagesEnabled=false")
+        options.add_argument("--disable-notifications")
     try:
         options.set_capability("pageLoadStrategy", "eager")
     except Exception:
         pass
+    # 超时在建会话时一并设定，不额外发命令：
+    # - 页面内等待（open_product_page、画廊采集）依赖 execute_async_script，放宽脚本超时；
+    # - 不使用隐式等待：所有等待均由页面内脚本/显式 WebDriverWait 负责，避免 find_element 未命中时被隐式拖慢
+    try:
+        options.set_capability("timeouts", {"script": SCRIPT_TIMEOUT_MS, "implicit": 0})
+    except Exception:
+        pass
 
     driver_path = find_msedgedriver_path()
     if not driver_path:
@@ -152,11 +256,15 @@ def init_edge_driver() -> webdriver.Edge:
 
     t1 = time.perf_counter()
     driver = webdriver.Edge(service=service, options=options)
-    driver.implicitly_wait(1)
+    # 通过 CDP 注册为“新文档加载前执行”的脚本：一次注册，后续每次导航都在页面脚本之前生效
+    stealth_js = "Object.defineProperty(navigator, 'webdriver', {get: () => undefined})"
     try:
-        driver.execute_script("Object.defineProperty(navigator, 'webdriver', {get: () => undefined})")
+        driver.execute_cdp_cmd("Page.addScriptToEvaluateOnNewDocument", {"source": stealth_js})
     except Exception:
-        pass
+        try:
+            driver.execute_script(stealth_js)
+        except Exception:
+            pass
     log_debug(f"初始化 EdgeDriver 耗时 {(time.perf_counter() - t0):.3f}s（创建Service {(t1 - t0)*1000:.0f}ms，启动Driver {(time.perf_counter() - t1)*1000:.0f}ms）")
     return driver
 
@@ -168,12 +276,19 @@ def open_product_page(driver: webdriver.Edge, url: str, wait_timeout: int = 30)
     t0 = time.perf_counter()
     driver.get(url)
     t_get = time.perf_counter()
-    time.sleep(0.3)
-    t_sleep = time.perf_counter()
-    WebDriverWait(driver, wait_timeout).until(
-        EC.presence_of_element_located((By.CSS_SELECTOR, SKU_ITEM_SELECTOR))
-    )
+    # 优先在页面内等待 SKU 区域出现（一次往返，DOM 变化即返回）；
+    # 脚本因页面跳转等原因中断时，退回 WebDriverWait 轮询剩余时间（超时抛出 TimeoutException）
+    found = False
+    try:
+        found = bool(driver.execute_async_script(_WAIT_FOR_SELECTOR_JS, SKU_ITEM_SELECTOR, int(wait_timeout * 1000)))
+    except Exception as e:
+        log_debug(f"页面内等待SKU区域中断，改为轮询: {e}")
+    if not found:
+        remain = max(0.0, wait_timeout - (time.perf_counter() - t_get))
+        WebDriverWait(driver, remain, poll_frequency=0.05).until(
+            EC.presence_of_element_located((By.CSS_SELECTOR, SKU_ITEM_SELECTOR))
+        )
     t_wait = time.perf_counter()
     log_debug(
-        f"打开商品页: get(url) {(t_get - t0)*1000:.0f}ms；随机等待 {(t_sleep - t_get)*1000:.0f}ms；等待SKU出现 {(t_wait - t_sleep)*1000:.0f}ms；总计 {(t_wait - t0):.3f}s"
+        f"打开商品页: get(url) {(t_get - t0)*1000:.0f}ms；等待SKU出现 {(t_wait - t_get)*1000:.0f}ms；总计 {(t_wait - t0):.3f}s"
     )
@@ -1,4 +1,7 @@
 import os
+import time
+import atexit
+import threading
 from pathlib import Path
 
 # 统一的公共工具：配置路径、日志、调试、文本规范化、读取商品链接
@@ -14,46 +17,85 @@ def conf_path(name: str) -> Path:
     return project_root() / "conf" / name
 
 
+# 配置文件内容缓存：路径 -> (修改时间 ns, 文本)；修改时间未变时只需一次 stat，无需重新打开读取
+_file_cache: dict[Path, tuple[int, str]] = {}
+
+
+def _cached_read(path: Path) -> str:
+    """按 (路径, 修改时间) 缓存读取 utf-8 文本文件；文件不存在时抛出 FileNotFoundError。"""
+    mtime = path.stat().st_mtime_ns
+    hit = _file_cache.get(path)
+    if hit is not None and hit[0] == mtime:
+        return hit[1]
+    text = path.read_text(encoding="utf-8")
+    _file_cache[path] = (mtime, text)
+    return text
+
+
 # 控制台/日志文本规范化（解决 Windows 控制台 GBK 下 '¥' 无法编码的问题）
 def normalize_price_text(txt: str) -> str:
+    # 常见情况（字符串）直接处理，不进入 try/except；将 '¥'(U+00A5) 统一替换为 '￥'(U+FFE5)
+    if isinstance(txt, str):
+        return txt.replace("¥", "￥").strip()
+    if txt is None:
+        return ""
     try:
-        if not isinstance(txt, str):
-            txt = str(txt)
+        txt = str(txt)
     except Exception:
-        txt = ""
-    # 将 '¥'(U+00A5) 统一替换为 '￥'(U+FFE5)
-    return (txt or "").replace("¥", "￥").strip()
+        return ""
+    return txt.replace("¥", "￥").strip()
 
 
-def debug_on() -> bool:
-    """调试开关：通过环境变量 DEBUG_RPA（1/true/yes/y/on）。"""
+def env_flag(name: str) -> bool:
+    """读取布尔型环境变量（1/true/yes/y/on 视为开启）。"""
     try:
-        v = os.environ.get("DEBUG_RPA", "").strip().lower()
+        v = os.environ.get(name, "").strip().lower()
         return v in ("1", "true", "yes", "y", "on")
     except Exception:
         return False
 
 
-def append_to_log(message: str) -> None:
-    """向 log/sku维度及选项.log 追加一行带时间戳的日志。"""
-    import datetime
-    log_dir = project_root() / "log"
-    log_dir.mkdir(parents=True, exist_ok=True)
-    log_path = log_dir / "sku维度及选项.log"
+# 调试开关在进程内不变，导入时求值一次
+_DEBUG_ON = env_flag("DEBUG_RPA")
 
-    timestamp = datetime.datetime.now().strftime("%H:%M:%S")
-    log_line = f"[{timestamp}] {message}\n"
 
-    try:
-        with open(log_path, "a", encoding="utf-8") as f:
-            f.write(log_line)
-            f.flush()
-    except UnicodeEncodeError:
-        clean_message = message.encode("utf-8", errors="ignore").decode("utf-8")
-        clean_log_line = f"[{timestamp}] {clean_message}\n"
-        with open(log_path, "a", encoding="utf-8") as f:
-            f.write(clean_log_line)
-            f.flush()
+def debug_on() -> bool:
+    """调试开关：通过环境变量 DEBUG_RPA（1/true/yes/y/on）。"""
+    return _DEBUG_ON
+
+
+# 日志文件句柄：首次写入时以追加 + 行缓冲模式打开并复用，进程退出时关闭
+_log_fh = None
+_log_lock = threading.Lock()
+# 时间戳缓存：[整秒, "HH:MM:SS"]，同一秒内的多行日志复用同一格式化结果
+_ts_cache = [0, ""]
+
+
+def _log_file():
+    """返回 log/sku维度及选项.log 的追加句柄（懒打开）。"""
+    global _log_fh
+    if _log_fh is None:
+        log_dir = project_root() / "log"
+        log_dir.mkdir(parents=True, exist_ok=True)
+        # errors="ignore"：无法编码的字符直接丢弃，避免因个别字符导致写日志失败
+        _log_fh = open(log_dir / "sku维度及选项.log", "a", encoding="utf-8", errors="ignore", buffering=1)
+        atexit.register(_log_fh.close)
+    return _log_fh
+
+
+def _write_log_lines(messages) -> None:
+    """将多条消息加上同一时间戳，拼接后一次写入日志文件。"""
+    sec = int(time.time())
+    with _log_lock:
+        if sec != _ts_cache[0]:
+            _ts_cache[:] = [sec, time.strftime("%H:%M:%S", time.localtime(sec))]
+        ts = _ts_cache[1]
+        _log_file().write("".join(f"[{ts}] {m}\n" for m in messages))
+
+
+def append_to_log(message: str) -> None:
+    """向 log/sku维度及选项.log 追加一行带时间戳的日志（复用同一文件句柄，按行刷新）。"""
+    _write_log_lines((message,))
 
 
 def log_debug(message: str) -> None:
@@ -66,11 +108,22 @@ def log_debug(message: str) -> None:
             pass
 
 
+def log_debug_many(messages: list[str]) -> None:
+    """批量输出调试信息：控制台逐条打印，日志文件只写入一次。仅在开启调试时生效。"""
+    if debug_on() and messages:
+        for m in messages:
+            print(f"[调试] {m}")
+        try:
+            _write_log_lines([f"调试: {m}" for m in messages])
+        except Exception:
+            pass
+
+
 def read_browser_path() -> str:
-    """从 conf/browser.txt 读取 Edge 可执行文件路径；若为空则回退为 'msedge.exe'。"""
+    """从 conf/browser.txt 读取 Edge 可执行文件路径；若为空则回退为 'msedge.exe'（按修改时间缓存）。"""
     path_file = conf_path("browser.txt")
     try:
-        content = path_file.read_text(encoding="utf-8").strip().strip('"')
+        content = _cached_read(path_file).strip().strip('"')
         if content:
             return content
     except Exception:
@@ -83,9 +136,11 @@ def read_product_url() -> str:
     规则：忽略空行、忽略以#开头的注释行，取第一条以 http/https 开头的链接。
     """
     path_file = conf_path("product-url.txt")
-    if not path_file.exists():
+    try:
+        content = _cached_read(path_file)
+    except FileNotFoundError:
         raise ValueError("未找到 conf/product-url.txt，请在 conf 目录提供该文件")
-    for line in path_file.read_text(encoding="utf-8").splitlines():
+    for line in content.splitlines():
         url = line.strip()
         if not url:
             continue
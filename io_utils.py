@@ -2,12 +2,17 @@ from pathlib import Path
 from typing import List
 from openpyxl import Workbook
 from openpyxl.utils import get_column_letter
-from openpyxl.styles import Alignment
-from common import append_to_log
+from openpyxl.styles import Alignment, NamedStyle
+from common import append_to_log, project_root
  
+import os
+import re
 import time
+import shutil
 import hashlib
+import threading
 from urllib.parse import urlparse
+from concurrent.futures import ThreadPoolExecutor
 try:
     import requests  # 可选依赖，用于下载图片到本地
 except Exception:
@@ -18,13 +23,15 @@ try:
 except Exception:
     PILImage = None  # type: ignore
     _HAS_PILLOW = False
-try:
-    import win32com.client as win32  # 可选依赖，用于通过 Excel COM 插入“链接的图片”
-except Exception:
-    win32 = None  # type: ignore
 
 # 导出相关工具
 
+# 价格数字片段（允许千分位逗号与小数部分，也允许省略整数位），如 "￥1,299.00" -> "1,299.00"，"¥.99" -> ".99"
+_PRICE_RE = re.compile(r"\d[\d,]*(?:\.\d+)?|\.\d+")
+# 全表统一的单元格对齐（居中 + 自动换行）：所有单元格共用同一对象（以命名样式 center_wrap 注册到工作簿）
+_CENTER_WRAP = Alignment(horizontal="center", vertical="center", wrap_text=True)
+_CENTER_WRAP_STYLE = "center_wrap"
+
 def _px_to_col_width(px: float) -> float:
     """将像素近似换算为 Excel 列宽(字符数)（保留，供可能的复用）。"""
     try:
@@ -56,6 +63,208 @@ def _sanitize_filename_component(name: str) -> str:
     return s or "未命名"
 
 
+def _short_url_hash(url: str) -> str:
+    """URL 的 10 位十六进制短哈希（BLAKE2b，digest_size=5，只计算需要的字节），用于回退文件名。"""
+    return hashlib.blake2b(url.encode("utf-8"), digest_size=5).hexdigest()
+
+
+def _existing_file_names(out_dir: Path) -> set[str]:
+    """一次列出目录中已有的非空文件名（小写），供下载前判断是否已存在，替代逐个文件 exists() 检查。
+    空文件（如上次异常中断遗留）不计入，会重新下载。
+    """
+    try:
+        with os.scandir(out_dir) as it:
+            return {e.name.lower() for e in it if e.is_file() and e.stat().st_size > 0}
+    except Exception:
+        return set()
+
+
+_PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+
+def _save_image_as_png(src: Path, target: Path) -> None:
+    """将已下载的图片文件保存为 PNG 文件。
+    - 已是 PNG：直接复制文件，不经 Pillow 解码/重新编码；
+    - 其他格式：有 Pillow 时转为 PNG（Pillow 直接从文件读取，不先整体读入内存）；无 Pillow 时按 PNG 后缀复制原始字节（可能非 PNG，但保证文件存在）。
+    先写入同目录临时文件再重命名为目标文件名：中途失败不会留下残缺的 PNG（否则下次会因“已存在”被跳过）。
+    """
+    with open(src, 'rb') as fsrc:
+        head = fsrc.read(len(_PNG_SIGNATURE))
+    tmp = target.with_name(f"{target.name}.{threading.get_ident()}.tmp")
+    try:
+        if head == _PNG_SIGNATURE or not _HAS_PILLOW:
+            shutil.copyfile(src, tmp)
+        else:
+            with PILImage.open(src) as pil_img:
+                if pil_img.mode not in ("RGB", "RGBA"):
+                    pil_img = pil_img.convert("RGB")
+                pil_img.save(tmp, format="PNG")
+        os.replace(tmp, target)
+    finally:
+        try:
+            tmp.unlink()
+        except OSError:
+            pass
+
+
+# 图片并发下载线程数（同时作为共享 Session 的连接池大小）
+_DOWNLOAD_WORKERS = 8
+# 图片原始字节的本地缓存目录：按 URL 哈希存放，跨商品/跨次运行复用，相同 URL 不再重复下载
+_IMG_CACHE_DIR = project_root() / "cache" / "img"
+# 缓存淘汰：超过保留天数的条目删除；总量超过上限时按最近使用时间从旧到新删除
+_IMG_CACHE_MAX_AGE_DAYS = 7
+_IMG_CACHE_MAX_BYTES = 512 * 1024 * 1024
+
+
+def _img_cache_path(url: str) -> Path:
+    """URL 对应的缓存文件路径：cache/img/<哈希前2位>/<哈希>。"""
+    key = hashlib.sha1(url.encode("utf-8")).hexdigest()
+    return _IMG_CACHE_DIR / key[:2] / key
+
+
+# 常见图片格式的文件头：(偏移, 字节)；WebP 为 "RIFF....WEBP"，需同时匹配两段
+_IMAGE_SIGNATURES = (
+    ((0, _PNG_SIGNATURE),),
+    ((0, b"\xff\xd8\xff"),),
+    ((0, b"GIF87a"),),
+    ((0, b"GIF89a"),),
+    ((0, b"RIFF"), (8, b"WEBP")),
+)
+
+
+def _looks_like_image(content_type: str, head: bytes) -> bool:
+    """响应是否为图片：Content-Type 为 image/*，或文件头为 PNG/JPEG/GIF/WebP 签名。"""
+    if (content_type or "").strip().lower().startswith("image/"):
+        return True
+    return any(all(head[off:off + len(sig)] == sig for off, sig in parts) for parts in _IMAGE_SIGNATURES)
+
+
+def _cached_fetch(url: str, sess, req_headers: dict) -> Path:
+    """返回 URL 对应的本地缓存文件；未命中时流式下载（分块写入临时文件，不在内存中保留整张图片），
+    完成后以“临时文件 + 重命名”原子落入缓存，下载失败时清理临时文件并抛出异常。
+    响应不是图片（如防盗链/登录页返回的 200 text/html）时丢弃临时文件并抛出 ValueError，不写入缓存。
+    """
+    path = _img_cache_path(url)
+    try:
+        if path.stat().st_size > 0:
+            # 命中时刷新修改时间，作为淘汰依据的“最近使用时间”
+            os.utime(path, None)
+            return path
+    except OSError:
+        pass
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    try:
+        with sess.get(url, headers=req_headers, timeout=20, stream=True) as resp:
+            resp.raise_for_status()
+            head = b""
+            with open(tmp, 'wb') as fout:
+                for chunk in resp.iter_content(chunk_size=64 * 1024):
+                    if len(head) < 16:
+                        head += chunk[:16 - len(head)]
+                    fout.write(chunk)
+            if not _looks_like_image(resp.headers.get("Content-Type", ""), head):
+                raise ValueError(f"响应不是图片: {resp.headers.get('Content-Type', '')}")
+        os.replace(tmp, path)
+    finally:
+        try:
+            tmp.unlink()
+        except OSError:
+            pass
+    return path
+
+
+def _prune_img_cache() -> None:
+    """清理图片缓存：删除超过 _IMG_CACHE_MAX_AGE_DAYS 天未使用的文件（含中断残留的临时文件），
+    剩余总量仍超过 _IMG_CACHE_MAX_BYTES 时按最近使用时间从旧到新删除；任何异常都忽略。
+    """
+    if not _IMG_CACHE_DIR.is_dir():
+        return
+    expire_before = time.time() - _IMG_CACHE_MAX_AGE_DAYS * 86400
+    entries = []
+    total = 0
+    for f in _IMG_CACHE_DIR.glob("*/*"):
+        try:
+            st = f.stat()
+            if st.st_mtime < expire_before:
+                f.unlink()
+                continue
+            if f.suffix != ".tmp":
+                entries.append((st.st_mtime, st.st_size, f))
+                total += st.st_size
+        except OSError:
+            pass
+    if total <= _IMG_CACHE_MAX_BYTES:
+        return
+    entries.sort(key=lambda e: e[0])
+    for _, size, f in entries:
+        try:
+            f.unlink()
+            total -= size
+        except OSError:
+            pass
+        if total <= _IMG_CACHE_MAX_BYTES:
+            break
+
+
+# 图片下载请求头中与 URL 无关的部分
+_IMG_USER_AGENT = (
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+    "(KHTML, like Gecko) Chrome/124.0.0.0 Safari/537.36 Edg/124.0.0.0"
+)
+_IMG_ACCEPT = "image/avif,image/webp,image/apng,image/*,*/*;q=0.8"
+
+
+def _image_request_headers(url: str) -> dict:
+    """图片下载请求头：Referer 取 URL 的协议与主机（只解析一次 URL），其余为固定值。"""
+    p = urlparse(url)
+    return {
+        "User-Agent": _IMG_USER_AGENT,
+        "Accept": _IMG_ACCEPT,
+        "Accept-Language": "zh-CN,zh;q=0.9",
+        "Referer": f"{p.scheme}://{p.hostname}/",
+        "Connection": "keep-alive",
+    }
+
+
+def _download_images_as_png(jobs: List[tuple]) -> int:
+    """并发下载 (url, 目标路径) 列表并保存为 PNG，返回成功数量。
+    各线程共享一个 requests.Session（连接池 + keep-alive），同一 CDN 主机不再逐张重建连接；单张失败不影响其他。
+    已缓存的 URL 直接读取本地缓存（见 _cached_fetch），每次调用开始前先按时间与总量清理一次缓存。
+    requests 不可用时跳过下载。
+    """
+    if not jobs or requests is None:
+        return 0
+    _prune_img_cache()
+    sess = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=_DOWNLOAD_WORKERS, pool_maxsize=_DOWNLOAD_WORKERS)
+    sess.mount("http://", adapter)
+    sess.mount("https://", adapter)
+
+    def _fetch(job) -> bool:
+        u, target = job
+        try:
+            cached = _cached_fetch(u, sess, _image_request_headers(u))
+        except Exception:
+            return False
+        try:
+            _save_image_as_png(cached, target)
+            return True
+        except Exception:
+            # 缓存内容无法保存为图片：删除该缓存条目，下次运行重新下载，避免坏条目一直被当作命中
+            try:
+                cached.unlink()
+            except OSError:
+                pass
+            return False
+
+    try:
+        with ThreadPoolExecutor(max_workers=min(_DOWNLOAD_WORKERS, len(jobs))) as pool:
+            return sum(1 for ok in pool.map(_fetch, jobs) if ok)
+    finally:
+        sess.close()
+
+
 def _generate_spec_image_filenames(headers: List[str], results: List[List[str]], out_dir: Path):
     """基于结果表推断每个规格图的友好文件名。
     返回 (spec_img_urls, url_to_filename)，其中：
@@ -64,7 +273,7 @@ def _generate_spec_image_filenames(headers: List[str], results: List[List[str]],
     规则：
       - 找到引用该 URL 的所有行，识别值恒定的维度列；
       - 若存在多个恒定维度，优先名字含“颜色/色/color”的维度；否则取第一个恒定维度；
-      - 文件名 = f"[{维度名}]{选项}.png"；若无法识别，则回退为 f"图片_{md5前10}.png"；
+      - 文件名 = f"[{维度名}]{选项}.png"；若无法识别，则回退为 f"图片_{URL短哈希}.png"；
       - 若同名冲突，则自动追加 " (2)", "(3)" 等后缀；
     """
     # 定位图片链接列索引
@@ -162,7 +371,7 @@ def _generate_spec_image_filenames(headers: List[str], results: List[List[str]],
             base = f"[{dim_name}]{opt_text}"
         else:
             # 回退：使用短哈希
-            base = f"图片_{hashlib.md5(url.encode('utf-8')).hexdigest()[:10]}"
+            base = f"图片_{_short_url_hash(url)}"
 
         candidate = base
         suffix = 2
@@ -179,163 +388,6 @@ def _generate_spec_image_filenames(headers: List[str], results: List[List[str]],
     return spec_img_urls, url_to_filename
 
 
-def _insert_linked_images_via_excel(xlsx_path: Path, img_col_idx: int, url_to_filename: dict, results: List[List[str]]) -> None:
-    """使用 Excel COM（win32com）在目标列插入“链接的图片”，不将图片数据保存进 Excel。
-    - LinkToFile=True, SaveWithDocument=False
-    - 形状随单元格移动/缩放，按单元格尺寸等比缩放并居中。
-    """
-    if img_col_idx == -1 or not results:
-        return
-    if win32 is None:
-        try:
-            print("[提示] 未安装 win32com（pywin32），将不会在表格中插入可见图片，仅保留链接列。")
-        except Exception:
-            pass
-        try:
-            append_to_log("未安装/不可用的 Excel COM，跳过插入‘链接的图片’，仅保留超链接")
-        except Exception:
-            pass
-        return
-
-    excel = win32.Dispatch("Excel.Application")
-    excel.Visible = False
-    try:
-        wb = excel.Workbooks.Open(str(xlsx_path))
-        ws = wb.Worksheets(1)
-
-        # 删除目标列（从第2行开始）已有的形状，避免重复叠加
-        try:
-            for i in range(ws.Shapes.Count, 0, -1):
-                shp = ws.Shapes.Item(i)
-                try:
-                    if shp.TopLeftCell.Column == (img_col_idx + 1) and shp.TopLeftCell.Row >= 2:
-                        shp.Delete()
-                except Exception:
-                    pass
-        except Exception:
-            pass
-
-        # 逐行插入“链接的图片”
-        inserted_total = 0
-        inserted_via_file = 0
-        inserted_via_url = 0
-        for r_idx, row in enumerate(results, start=2):  # Excel 行号从2开始（第1行为表头）
-            try:
-                url = str(row[img_col_idx]).strip()
-            except Exception:
-                url = ""
-            fname = url_to_filename.get(url)
-            png_path = (xlsx_path.parent / fname).resolve() if fname else None
-
-            cell = ws.Cells(r_idx, img_col_idx + 1)
-            # 若该单元格处于合并区域中，且不是合并区域的首行，则跳过，避免重复插入同一张图片
-            try:
-                if cell.MergeCells:
-                    try:
-                        top_row = int(cell.MergeArea.Row)
-                    except Exception:
-                        top_row = int(cell.Row)
-                    if int(cell.Row) != top_row:
-                        continue
-            except Exception:
-                pass
-            left = float(cell.Left)
-            top = float(cell.Top)
-            # 若为合并单元格，优先使用整个合并区域的宽高，确保图片能铺满合并后的单元格
-            try:
-                if cell.MergeCells:
-                    area = cell.MergeArea
-                    cell_w = float(area.Width)
-                    cell_h = float(area.Height)
-                else:
-                    cell_w = float(cell.Width)
-                    cell_h = float(cell.Height)
-            except Exception:
-                cell_w = float(cell.Width)
-                cell_h = float(cell.Height)
-            # 计算按原始比例缩放后适配单元格的尺寸（优先使用本地PNG的真实尺寸）
-            target_w, target_h = cell_w, cell_h
-            if png_path is not None and png_path.exists():
-                try:
-                    if _HAS_PILLOW:
-                        with PILImage.open(str(png_path)) as _im:
-                            ow, oh = _im.size
-                        if ow > 0 and oh > 0 and cell_w > 0 and cell_h > 0:
-                            sc = min(cell_w / float(ow), cell_h / float(oh), 1.0)
-                            target_w = max(1.0, float(ow) * sc)
-                            target_h = max(1.0, float(oh) * sc)
-                except Exception:
-                    target_w, target_h = cell_w, cell_h
-
-            try:
-                # 优先使用本地 PNG 文件（若存在且路径有效）
-                if png_path is not None and png_path.exists():
-                    shp = ws.Shapes.AddPicture(str(png_path), True, False, left, top, target_w, target_h)
-                    inserted_via_file += 1
-                else:
-                    # 本地文件不可用：尝试直接使用网络 URL 插入（同样为“链接”方式）
-                    if url and (url.startswith("http://") or url.startswith("https://")):
-                        shp = ws.Shapes.AddPicture(str(url), True, False, left, top, cell_w, cell_h)
-                        inserted_via_url += 1
-                    else:
-                        continue
-            except Exception:
-                # 兼容部分版本：尝试 AddPicture2
-                try:
-                    if png_path is not None and png_path.exists():
-                        shp = ws.Shapes.AddPicture2(str(png_path), True, False, left, top, target_w, target_h)
-                        inserted_via_file += 1
-                    else:
-                        if url and (url.startswith("http://") or url.startswith("https://")):
-                            shp = ws.Shapes.AddPicture2(str(url), True, False, left, top, cell_w, cell_h)
-                            inserted_via_url += 1
-                        else:
-                            continue
-                except Exception:
-                    continue
-
-            try:
-                # 随单元格移动与缩放
-                shp.Placement = 1  # xlMoveAndSize
-                shp.LockAspectRatio = True
-                # 仅设置可读的替代文本，避免修改链接源导致某些环境下路径解析问题
-                try:
-                    shp.AlternativeText = png_path.name
-                except Exception:
-                    pass
-                # 再次确保完全贴合单元格边界（等比缩放）
-                if cell_w > 0 and cell_h > 0 and shp.Width and shp.Height:
-                    scale = min(cell_w / max(1.0, float(shp.Width)), cell_h / max(1.0, float(shp.Height)), 1.0)
-                    shp.Width = max(1.0, float(shp.Width) * scale)
-                    shp.Height = max(1.0, float(shp.Height) * scale)
-                # 居中对齐（至少有一边会完全贴合单元格边界，比例不变）。若为合并区域，则基于合并区域宽高进行居中。
-                shp.Left = float(cell.Left) + max(0.0, (float(cell_w) - float(shp.Width)) / 2.0)
-                shp.Top = float(cell.Top) + max(0.0, (float(cell_h) - float(shp.Height)) / 2.0)
-            except Exception:
-                pass
-            else:
-                inserted_total += 1
-
-        wb.Save()
-        wb.Close(SaveChanges=True)
-        try:
-            if inserted_via_file or inserted_via_url:
-                print(f"[步骤] 已通过Excel COM插入图片: 本地文件 {inserted_via_file} 张，网络URL {inserted_via_url} 张")
-        except Exception:
-            pass
-        try:
-            if inserted_total:
-                append_to_log(f"通过 Excel COM 插入图片完成：本地 {inserted_via_file}，网络 {inserted_via_url}，总计 {inserted_total}")
-            else:
-                append_to_log("Excel COM 插入图片数量为 0：可能需要在 Excel 中点击‘启用内容’或检查图片本地文件/网络可达性")
-        except Exception:
-            pass
-    finally:
-        try:
-            excel.Quit()
-        except Exception:
-            pass
-
 def _merge_consecutive_cells(ws, results: List[List[str]], headers: List[str], img_col_idx: int) -> None:
     """按列合并相邻且值相同的单元格（第1行为表头，从第2行开始）。
     - 对“图片”列：基于原始图片 URL 判断是否相同（而不是单元格显示的“查看图片”文本）。
@@ -411,15 +463,6 @@ def export_results_to_excel(results: List[List[str]], headers: List[str], file_p
     ws = wb.active
     ws.title = "结果"
 
-    # 写入表头
-    ws.append(headers)
-    # 表头样式：居中 + 自动换行
-    for c in ws[1]:
-        c.alignment = Alignment(horizontal="center", vertical="center", wrap_text=True)
-
-    # 统计每列最大文本长度（用于后续列宽自适应）
-    max_text_len = [len(str(h)) for h in headers]
-
     # 识别“图片”与“图片链接”列索引（没有则返回 -1）——当前逻辑已不包含图片列
     img_col_idx = -1
     img_link_col_idx = -1
@@ -432,52 +475,51 @@ def export_results_to_excel(results: List[List[str]], headers: List[str], file_p
     # 统一设置图片与链接列列宽（若存在）
     # 不含图片列，无需设置图片列宽
 
+    # 先整理出全部待写入的行，再一次性设置列宽、逐行追加（不在追加过程中反复按坐标取单元格）
+    price_is_last = bool(headers) and headers[-1] == "价格"
+    n_dims = max(0, len(headers) - 1)
+    rows_for_write: List[list] = []
     for row in results:
         # 价格列数值化（要求“价格”为最后一列表头）
-        if headers and headers[-1] == "价格":
+        if price_is_last:
             # 价格在行的最后一个元素（隐藏图片列在价格前一位，故不能用表头索引）
             try:
                 last_val = row[-1]
             except Exception:
                 last_val = ""
-            if any(ch.isdigit() for ch in str(last_val)):
-                row[-1] = float(next((t for t in ''.join((c if (c.isdigit() or c in '.,') else ' ') for c in str(last_val)).split() if t), '0').replace(',', ''))
+            m = _PRICE_RE.search(str(last_val))
+            if m:
+                row[-1] = float(m.group(0).replace(',', ''))
 
         # 写入“各维度 + 价格”：取前 len(headers)-1 个为维度，最后一项强制取行末尾（价格）
         try:
-            dims_part = list(row[:max(0, len(headers) - 1)])
+            dims_part = list(row[:n_dims])
         except Exception:
             dims_part = []
         try:
-            price_part = [row[-1]] if headers and len(headers) >= 1 else []
+            price_part = [row[-1]] if headers else []
         except Exception:
             price_part = [""]
-        row_for_write = dims_part + price_part
-        ws.append(row_for_write)
-        current_row = ws.max_row
+        rows_for_write.append(dims_part + price_part)
 
-        # 当前行单元格统一样式（上下左右居中、自动换行）
-        for ci in range(1, len(headers) + 1):
-            ws.cell(row=current_row, column=ci).alignment = Alignment(horizontal="center", vertical="center", wrap_text=True)
-
-        # 统计文本长度用于自适应列宽（以写入后的内容计算，图片列跳过）
-        for j in range(len(headers)):
-            try:
-                txt = row_for_write[j] if j < len(row_for_write) else ""
-                txt_len = len(str(txt))
-            except Exception:
-                txt_len = 0
-            if j < len(max_text_len) and txt_len > max_text_len[j]:
-                max_text_len[j] = txt_len
+    # 文本列近似自适应列宽：按列统计最大文本长度（含表头），控制在 [10, 40] 以内，避免过窄或过宽
+    for j in range(len(headers)):
+        max_len = max((len(str(r[j])) for r in rows_for_write if j < len(r)), default=0)
+        max_len = max(max_len, len(str(headers[j])))
+        ws.column_dimensions[get_column_letter(j + 1)].width = max(10, min(40, max_len + 2))
 
-        # 不含图片列，无需写入备用超链接
+    # 写入表头与数据行
+    ws.append(headers)
+    for row_for_write in rows_for_write:
+        ws.append(row_for_write)
 
-    # 文本列近似自适应列宽（跳过“图片”与“图片链接”列）
-    for j in range(len(headers)):
-        col_letter_j = get_column_letter(j + 1)
-        # 控制在 [10, 40] 以内，避免过窄或过宽
-        target_width = max(10, min(40, (max_text_len[j] if j < len(max_text_len) else 10) + 2))
-        ws.column_dimensions[col_letter_j].width = target_width
+    # 全表单元格统一样式（上下左右居中、自动换行）：注册为命名样式，各单元格只引用同一样式，按行一次遍历
+    center_wrap = NamedStyle(name=_CENTER_WRAP_STYLE)
+    center_wrap.alignment = _CENTER_WRAP
+    wb.add_named_style(center_wrap)
+    for row_cells in ws.iter_rows(min_row=1, max_row=ws.max_row, max_col=len(headers)):
+        for c in row_cells:
+            c.style = _CENTER_WRAP_STYLE
 
     # 若存在图片列，给数据行一个适中的行高，便于后续 COM 插入的图片按单元格自适应可见
     # 不含图片列，无需设置行高
@@ -529,7 +571,6 @@ def export_results_to_yaml(sku_dimensions, results: List[List[str]], headers: Li
             dim_names = [getattr(d, 'name', f'维度{i+1}') for i, d in enumerate(sku_dimensions)]
     except Exception:
         dim_names = [getattr(d, 'name', f'维度{i+1}') for i, d in enumerate(sku_dimensions)]
-    dim_count = len(dim_names)
 
     # 构建 specs 映射：维度 -> 选项列表，并保留维度顺序
     specs_map = {}
@@ -593,16 +634,9 @@ def export_results_to_yaml(sku_dimensions, results: List[List[str]], headers: Li
         except Exception:
             s = ''
         # 同 Excel 逻辑：抽取首个数字片段
-        try:
-            tokens = ''.join((c if (c.isdigit() or c in '.,') else ' ') for c in s).split()
-            for t in tokens:
-                if any(ch.isdigit() for ch in t):
-                    try:
-                        return float(t.replace(',', '')), s
-                    except Exception:
-                        continue
-        except Exception:
-            pass
+        m = _PRICE_RE.search(s)
+        if m:
+            return float(m.group(0).replace(',', '')), s
         return None, s
 
     # 去重“规格图”并生成友好文件名（与 Excel 下载/命名规则一致）
@@ -612,41 +646,13 @@ def export_results_to_yaml(sku_dimensions, results: List[List[str]], headers: Li
     # 下载规格图到本地（与友好文件名一致保存为 PNG；在缺少 Pillow 时以原始字节落盘）
     downloaded = 0
     if spec_img_urls:
+        existing = _existing_file_names(out_dir)
+        jobs = []
         for u in spec_img_urls:
-            try:
-                fname = friendly_map.get(u) or f"图片_{hashlib.md5(u.encode('utf-8')).hexdigest()[:10]}.png"
-                target = out_dir / fname
-                if target.exists():
-                    continue
-                # 若 requests 不可用，跳过下载
-                if requests is None:
-                    continue
-                req_headers = {
-                    "User-Agent": (
-                        "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
-                        "(KHTML, like Gecko) Chrome/124.0.0.0 Safari/537.36 Edg/124.0.0.0"
-                    ),
-                    "Accept": "image/avif,image/webp,image/apng,image/*,*/*;q=0.8",
-                    "Accept-Language": "zh-CN,zh;q=0.9",
-                    "Referer": f"{urlparse(u).scheme}://{urlparse(u).hostname}/",
-                    "Connection": "keep-alive",
-                }
-                resp = requests.get(u, headers=req_headers, timeout=20)
-                resp.raise_for_status()
-                if _HAS_PILLOW:
-                    from io import BytesIO
-                    bio = BytesIO(resp.content)
-                    pil_img = PILImage.open(bio)
-                    if pil_img.mode not in ("RGB", "RGBA"):
-                        pil_img = pil_img.convert("RGB")
-                    pil_img.save(target, format="PNG")
-                else:
-                    # 无 Pillow：直接按 PNG 后缀落盘原始字节（可能非 PNG，但保证文件存在）
-                    with open(target, 'wb') as fbin:
-                        fbin.write(resp.content)
-                downloaded += 1
-            except Exception:
-                pass
+            fname = friendly_map.get(u) or f"图片_{_short_url_hash(u)}.png"
+            if fname.lower() not in existing:
+                jobs.append((u, out_dir / fname))
+        downloaded = _download_images_as_png(jobs)
         try:
             if downloaded:
                 print(f"[步骤] 已下载规格图 {downloaded} 张到: {out_dir}")
@@ -676,7 +682,7 @@ def export_results_to_yaml(sku_dimensions, results: List[List[str]], headers: Li
     lines.append('\n# 规格图（主图区域在选中特定规格后展示的图片）\n')
     lines.append('spec_images:\n')
     for u in spec_img_urls:
-        file_name = friendly_map.get(u) or f"图片_{hashlib.md5(u.encode('utf-8')).hexdigest()[:10]}.png"
+        file_name = friendly_map.get(u) or f"图片_{_short_url_hash(u)}.png"
         lines.append('  - file: ' + _yaml_escape_value(file_name) + '\n')
         lines.append('    url: ' + _yaml_escape_value(u) + '\n')
 
@@ -684,18 +690,18 @@ def export_results_to_yaml(sku_dimensions, results: List[List[str]], headers: Li
     lines.append('# 说明：选项索引基于 specs[dims[i]]（0 起）；价格为数值或 null\n')
     # 紧凑组合：行内序列（flow style）：[d0, d1, ..., price]
     lines.append('combos:\n')
+    # 每个维度的“选项文本 -> 索引”字典在循环外取好，行内只做一次字典查找
+    dim_index_maps = [option_index_map.get(dim_n, {}) for dim_n in dim_names]
     for row in results or []:
         try:
             # 维度索引列表
             idx_list: List[str] = []
-            for i in range(dim_count):
-                dim_n = dim_names[i] if i < len(dim_names) else f"维度{i+1}"
+            for i, index_map in enumerate(dim_index_maps):
                 try:
                     v_txt = str(row[i]).strip()
                 except Exception:
                     v_txt = ''
-                idx = option_index_map.get(dim_n, {}).get(v_txt, -1)
-                idx_list.append(str(idx))
+                idx_list.append(str(index_map.get(v_txt, -1)))
             # 价格
             price_val = row[-1] if row else ''
             price_num, _price_text = _extract_price(price_val)
@@ -726,45 +732,18 @@ def download_product_main_images(urls: List[str], out_dir: Path) -> int:
     """下载商品主图画廊图片到 out_dir，文件命名为：商品主图-序号.png（1 起）。
     若文件已存在则跳过。返回成功下载数量。
     """
-    count = 0
     if not urls:
         return 0
     out_dir.mkdir(parents=True, exist_ok=True)
+    existing = _existing_file_names(out_dir)
+    jobs = []
     for i, u in enumerate(urls, start=1):
-        try:
-            if not (isinstance(u, str) and (u.startswith("http://") or u.startswith("https://"))):
-                continue
-            fname = f"商品主图-{i}.png"
-            target = out_dir / fname
-            if target.exists():
-                continue
-            if requests is None:
-                continue
-            req_headers = {
-                "User-Agent": (
-                    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
-                    "(KHTML, like Gecko) Chrome/124.0.0.0 Safari/537.36 Edg/124.0.0.0"
-                ),
-                "Accept": "image/avif,image/webp,image/apng,image/*,*/*;q=0.8",
-                "Accept-Language": "zh-CN,zh;q=0.9",
-                "Referer": f"{urlparse(u).scheme}://{urlparse(u).hostname}/",
-                "Connection": "keep-alive",
-            }
-            resp = requests.get(u, headers=req_headers, timeout=20)
-            resp.raise_for_status()
-            if _HAS_PILLOW:
-                from io import BytesIO
-                bio = BytesIO(resp.content)
-                pil_img = PILImage.open(bio)
-                if pil_img.mode not in ("RGB", "RGBA"):
-                    pil_img = pil_img.convert("RGB")
-                pil_img.save(target, format="PNG")
-            else:
-                with open(target, 'wb') as fbin:
-                    fbin.write(resp.content)
-            count += 1
-        except Exception:
+        if not (isinstance(u, str) and (u.startswith("http://") or u.startswith("https://"))):
             continue
+        fname = f"商品主图-{i}.png"
+        if fname.lower() not in existing:
+            jobs.append((u, out_dir / fname))
+    count = _download_images_as_png(jobs)
     try:
         if count:
             print(f"[步骤] 已下载商品主图 {count} 张到: {out_dir}")
@@ -3,6 +3,7 @@ import time
 from pathlib import Path
 import re
 import os
+from concurrent.futures import ThreadPoolExecutor
 
 # 模块化导入
 from common import read_product_url, log_debug
@@ -16,8 +17,7 @@ from sku_utils import (
     parse_sku_dimensions,
     print_dimensions_summary,
     write_dimensions_structure_log,
-    get_product_name,
-    get_shop_name,
+    get_shop_and_product_name,
 )
 from traversal import (
     generate_all_combinations,
@@ -58,8 +58,7 @@ def traverse_all_sku_combinations():
         log_debug(f"阶段耗时：打开页面 {(t_after_open - t_after_init):.3f}s；解析SKU {(t_after_parse - t_after_open):.3f}s")
 
         # 解析店铺名与商品名（用于导出目录名）
-        shop_name = get_shop_name(driver)
-        product_name = get_product_name(driver)
+        shop_name, product_name = get_shop_and_product_name(driver)
         print(f"[信息] 店铺: {shop_name} | 商品: {product_name}")
 
         # 概要信息与结构日志
@@ -95,22 +94,27 @@ def traverse_all_sku_combinations():
             gallery_urls = collect_main_gallery_image_urls(driver)
         except Exception:
             gallery_urls = []
-        try:
-            if gallery_urls:
-                download_product_main_images(gallery_urls, output_dir)
-        except Exception:
-            pass
 
-        print("[步骤] 开始遍历所有SKU组合...")
+        # 主图下载只涉及网络与磁盘，与后续 SKU 遍历（只操作浏览器）互不依赖：放到后台线程并行执行
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            gallery_future = pool.submit(download_product_main_images, gallery_urls, output_dir) if gallery_urls else None
+
+            print("[步骤] 开始遍历所有SKU组合...")
 
-        # 遍历并收集
-        results, success_count = traverse_and_collect(
-            driver=driver,
-            sku_dimensions=sku_dimensions,
-            combinations=combinations,
-            last_selected_vids=last_selected_vids if 'last_selected_vids' in locals() else [],
-            t_after_parse=t_after_parse,
-        )
+            # 遍历并收集
+            results, success_count = traverse_and_collect(
+                driver=driver,
+                sku_dimensions=sku_dimensions,
+                combinations=combinations,
+                last_selected_vids=last_selected_vids if 'last_selected_vids' in locals() else [],
+                t_after_parse=t_after_parse,
+            )
+
+            try:
+                if gallery_future is not None:
+                    gallery_future.result()
+            except Exception:
+                pass
 
         print(f"\n[步骤] 遍历完成！成功处理 {success_count}/{len(combinations)} 个组合")
 
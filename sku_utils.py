@@ -2,15 +2,15 @@ from dataclasses import dataclass
 from typing import List
 import time
 from pathlib import Path
-from selenium.webdriver.common.by import By
 
-from common import log_debug, normalize_price_text
+from common import log_debug, log_debug_many, debug_on, normalize_price_text
 
 # 统一的页面元素选择器常量，便于维护与复用（避免写死哈希后缀）
 SKU_ITEM_SELECTOR = "[class*='skuItem']"
 SKU_OPTION_SELECTOR = "[class*='valueItem']:not([class*='ImgWrap'])"
 DIM_LABEL_SELECTOR = "[class*='ItemLabel'] span.f-els-2"
 OPTION_TEXT_SELECTOR = "span.f-els-1"
+SKU_OPTION_WITH_VID_SELECTOR = f"{SKU_OPTION_SELECTOR}[data-vid]"
 
 # 价格相关选择器（主选择器仍优先，配合兜底）
 PRICE_MAIN_TEXT = "[class*='highlightPrice'] [class*='text']"
@@ -22,10 +22,46 @@ PRICE_ALT_SELECTORS = [
     ".tm-price-current",
     "[class*='highlightPrice'] [class*='text']",
 ]
+# 价格带兜底：在价格带容器内查找首个含数字的文本节点
+PRICE_BELT_SELECTOR = "[class*='beltPrice']"
+PRICE_WRAP_SELECTOR = "[class*='priceWrap']"
+PRICE_BELT_NODE_SELECTOR = "[class*='text'], [class*='number']"
+# 传入页面取价脚本的选择器集合
+_PRICE_SELECTORS = {
+    "main": PRICE_MAIN_TEXT,
+    "sym": PRICE_SYMBOL,
+    "alts": PRICE_ALT_SELECTORS,
+    "belt": PRICE_BELT_SELECTOR,
+    "wrap": PRICE_WRAP_SELECTOR,
+    "node": PRICE_BELT_NODE_SELECTOR,
+}
 
 # 主图区域相关选择器（展示图片可能为规格图）
 MAIN_PIC_IMG_SELECTOR = "img[class*='mainPic']"
+MAIN_PIC_WRAP_SELECTOR = "[class*='mainPicWrap']"
 ZOOM_IMG_DIV_SELECTOR = ".js-image-zoom__zoomed-image"
+THUMBS_WRAP_SELECTOR = "[class*='thumbnailsWrap']"
+# 缩略图项（相对于缩略图区域）；全局选择器仅在找不到缩略图区域时兜底使用
+THUMB_ITEM_IN_WRAP_SELECTOR = "[class*='thumbnailItem']"
+THUMB_ITEM_SELECTOR = f"{THUMBS_WRAP_SELECTOR} {THUMB_ITEM_IN_WRAP_SELECTOR}"
+# 画廊采集脚本总时限（ms）：低于 driver 的脚本超时 browser_utils.SCRIPT_TIMEOUT_MS（60s），保证超时前回调已采集的结果
+GALLERY_BUDGET_MS = 25000
+# 主图兜底：在全局范围按序尝试的候选图片选择器（数据表形式，便于按命中率调整顺序）
+MAIN_IMAGE_FALLBACK_SELECTORS = [
+    MAIN_PIC_IMG_SELECTOR,
+    f"{MAIN_PIC_WRAP_SELECTOR} img",
+    "img[src*='alicdn.com']",
+    "img[src*='gw.alicdn.com']",
+    "img[src*='/bao/uploaded/']",
+    "img[src*='/imgextra/']",
+]
+# 传入页面主图读取脚本的选择器集合
+_MAIN_IMAGE_SELECTORS = {
+    "img": MAIN_PIC_IMG_SELECTOR,
+    "zoom": ZOOM_IMG_DIV_SELECTOR,
+    "wrap": MAIN_PIC_WRAP_SELECTOR,
+    "cands": MAIN_IMAGE_FALLBACK_SELECTORS,
+}
 
 # 商品名与店铺名选择器（基于 元素示例/商品名.html 与 元素示例/店铺名.html）
 # 使用包含匹配以兼容哈希后缀类名变化
@@ -44,42 +80,62 @@ class SkuOption:
 class SkuDimension:
     name: str
     options: List[SkuOption]
+    # 解析时页面上该维度已选中的 vid（未选中为空串）
+    selected_vid: str = ""
+
+
+# 页面内判断选项是否选中的 JS 函数（class 含 selected/active/checked，或 aria-checked/data-selected 为 true），供批量脚本拼接复用
+IS_SELECTED_JS = (
+    "function isSelected(el){\n"
+    "  var cls = el.getAttribute('class') || '';\n"
+    "  if (/selected|Selected|active|checked/.test(cls)) return true;\n"
+    "  if ((el.getAttribute('aria-checked') || '').toLowerCase() === 'true') return true;\n"
+    "  return (el.getAttribute('data-selected') || '').toLowerCase() === 'true';\n"
+    "}\n"
+)
+
+
+# 解析全部维度与选项的页面脚本（同时返回各维度已选 vid；模块加载时拼接一次）
+_PARSE_SKU_JS = (
+    "return (function(itemSel, labelSel, optionSel, textSel){\n"
+    + IS_SELECTED_JS +
+    "  var items = Array.from(document.querySelectorAll(itemSel));\n"
+    "  var dims = [];\n"
+    "  for (var i=0; i<items.length; i++){\n"
+    "    var item = items[i];\n"
+    "    var label = item.querySelector(labelSel);\n"
+    "    var name = label ? (label.getAttribute('title') || label.textContent || ('维度' + (i+1))) : ('维度' + (i+1));\n"
+    "    var opts = [];\n"
+    "    var selected = '';\n"
+    "    var nodes = Array.from(item.querySelectorAll(optionSel));\n"
+    "    for (var j=0; j<nodes.length; j++){\n"
+    "      var el = nodes[j];\n"
+    "      // 顺带记录当前已选中的 vid，省去遍历前单独读取已选状态的一次往返\n"
+    "      if (!selected && isSelected(el)) selected = el.getAttribute('data-vid') || '';\n"
+    "      var dis = (el.getAttribute('data-disabled') || '').toLowerCase() === 'true';\n"
+    "      if (dis) continue;\n"
+    "      var vid = el.getAttribute('data-vid');\n"
+    "      var span = el.querySelector(textSel);\n"
+    "      var txt = span ? (span.getAttribute('title') || span.textContent || '').trim() : '';\n"
+    "      if (vid && txt){ opts.push({vid: vid, text: txt}); }\n"
+    "    }\n"
+    "    if (opts.length){ dims.push({name: name.trim(), options: opts, selected: selected}); }\n"
+    "  }\n"
+    "  return dims;\n"
+    "})(arguments[0], arguments[1], arguments[2], arguments[3]);"
+)
 
 
 def parse_sku_dimensions(driver) -> List[SkuDimension]:
-    """解析页面上的所有 SKU 维度与选项。"""
+    """解析页面上的所有 SKU 维度与选项（同时记录各维度当前已选中的 vid）。"""
     print("[步骤] 解析SKU维度和选项...")
     t0 = time.perf_counter()
-    js = (
-        "return (function(itemSel, labelSel, optionSel, textSel){\n"
-        "  var items = Array.from(document.querySelectorAll(itemSel));\n"
-        "  var dims = [];\n"
-        "  for (var i=0; i<items.length; i++){\n"
-        "    var item = items[i];\n"
-        "    var label = item.querySelector(labelSel);\n"
-        "    var name = label ? (label.getAttribute('title') || label.textContent || ('维度' + (i+1))) : ('维度' + (i+1));\n"
-        "    var opts = [];\n"
-        "    var nodes = Array.from(item.querySelectorAll(optionSel));\n"
-        "    for (var j=0; j<nodes.length; j++){\n"
-        "      var el = nodes[j];\n"
-        "      var dis = (el.getAttribute('data-disabled') || '').toLowerCase() === 'true';\n"
-        "      if (dis) continue;\n"
-        "      var vid = el.getAttribute('data-vid');\n"
-        "      var span = el.querySelector(textSel);\n"
-        "      var txt = span ? (span.getAttribute('title') || span.textContent || '').trim() : '';\n"
-        "      if (vid && txt){ opts.push({vid: vid, text: txt}); }\n"
-        "    }\n"
-        "    if (opts.length){ dims.push({name: name.trim(), options: opts}); }\n"
-        "  }\n"
-        "  return dims;\n"
-        "})(arguments[0], arguments[1], arguments[2], arguments[3]);"
-    )
 
     dims_data = driver.execute_script(
-        js,
+        _PARSE_SKU_JS,
         SKU_ITEM_SELECTOR,
         DIM_LABEL_SELECTOR,
-        f"{SKU_OPTION_SELECTOR}[data-vid]",
+        SKU_OPTION_WITH_VID_SELECTOR,
         OPTION_TEXT_SELECTOR,
     ) or []
 
@@ -89,7 +145,7 @@ def parse_sku_dimensions(driver) -> List[SkuDimension]:
             name = (d.get('name') or '').strip() or '未命名维度'
             opts = [SkuOption(vid=str(o.get('vid') or ''), text=str(o.get('text') or '').strip()) for o in (d.get('options') or [])]
             if opts:
-                sku_dimensions.append(SkuDimension(name=name, options=opts))
+                sku_dimensions.append(SkuDimension(name=name, options=opts, selected_vid=str(d.get('selected') or '')))
     except Exception as e:
         log_debug(f"JS 解析SKU异常: {e}")
 
@@ -97,126 +153,230 @@ def parse_sku_dimensions(driver) -> List[SkuDimension]:
     return sku_dimensions
 
 
-def is_selected_element(elem) -> bool:
-    """判断一个选项元素是否处于选中状态。"""
-    try:
-        cls = (elem.get_attribute("class") or "")
-        if ("selected" in cls) or ("Selected" in cls) or ("active" in cls) or ("checked" in cls):
-            return True
-        if (elem.get_attribute("aria-checked") or "").lower() == "true":
-            return True
-        if (elem.get_attribute("data-selected") or "").lower() == "true":
-            return True
-    except Exception:
-        pass
-    return False
-
-
-def read_current_selected_vids(driver, dims_count: int) -> List[str]:
-    """读取当前页面中每个维度已选中的 data-vid（若未选中返回空字符串）。"""
-    vids: List[str] = []
-    try:
-        sku_items = driver.find_elements(By.CSS_SELECTOR, SKU_ITEM_SELECTOR)
-        for idx in range(min(dims_count, len(sku_items))):
-            item = sku_items[idx]
-            selected = ""
-            try:
-                candidates = item.find_elements(By.CSS_SELECTOR, f"{SKU_OPTION_SELECTOR}[data-vid]")
-                for el in candidates:
-                    if is_selected_element(el):
-                        v = el.get_attribute("data-vid") or ""
-                        if v:
-                            selected = v
-                            break
-            except Exception:
-                pass
-            vids.append(selected)
-    except Exception:
-        pass
-    return vids
-
-
-def get_price_text(driver) -> str:
-    """获取当前所选组合的价格文本（主选择器优先 + 包含匹配兜底；JS一次性查询 + 短轮询）。"""
-    js = (
-        "return (function(mainSel, symSel, alts, beltSel, wrapSel, nodeSel){\n"
-        "  function pickFromMain(){\n"
-        "    try{\n"
-        "      var mainText = document.querySelector(mainSel);\n"
-        "      var symbolEl = document.querySelector(symSel);\n"
-        "      if (mainText && mainText.textContent){\n"
-        "        var sym = symbolEl && symbolEl.textContent ? symbolEl.textContent.trim() : '¥';\n"
-        "        var txt = mainText.textContent.trim();\n"
-        "        if (txt) return sym + txt;\n"
-        "      }\n"
-        "    }catch(e){}\n"
-        "    return '';\n"
-        "  }\n"
-        "  function pickFromAlts(){\n"
-        "    try{\n"
-        "      alts = Array.isArray(alts) ? alts : [];\n"
-        "      for (var i=0; i<alts.length; i++){\n"
-        "        var el = document.querySelector(alts[i]);\n"
-        "        if (el && el.textContent){\n"
-        "          var t = el.textContent.trim();\n"
-        "          if (t){\n"
-        "            if (t.indexOf('¥') !== -1 || t.indexOf('￥') !== -1) return t;\n"
-        "            return '¥' + t;\n"
-        "          }\n"
-        "        }\n"
-        "      }\n"
-        "    }catch(e){}\n"
-        "    return '';\n"
-        "  }\n"
-        "  function pickFromBelt(){\n"
-        "    try{\n"
-        "      var belt = document.querySelector(beltSel);\n"
-        "      if (!belt) return '';\n"
-        "      var container = belt.querySelector(wrapSel) || belt;\n"
-        "      var nodes = container.querySelectorAll(nodeSel);\n"
-        "      for (var j=0; j<nodes.length; j++){\n"
-        "        var tt = (nodes[j].textContent || '').trim();\n"
-        "        if (tt && /\\d/.test(tt)){\n"
-        "          if (tt.indexOf('¥') !== -1 || tt.indexOf('￥') !== -1) return tt;\n"
-        "          return '¥' + tt;\n"
-        "        }\n"
-        "      }\n"
-        "    }catch(e){}\n"
-        "    return '';\n"
-        "  }\n"
-        "  return pickFromMain() || pickFromAlts() || pickFromBelt();\n"
-        "})(arguments[0], arguments[1], arguments[2], arguments[3], arguments[4], arguments[5]);"
-    )
-
-    t_price0 = time.perf_counter()
-    end_time = time.perf_counter() + 0.3
-    last = ""
-    while time.perf_counter() < end_time:
-        try:
-            price = (
-                driver.execute_script(
-                    js,
-                    PRICE_MAIN_TEXT,
-                    PRICE_SYMBOL,
-                    PRICE_ALT_SELECTORS,
-                    "[class*='beltPrice']",
-                    "[class*='priceWrap']",
-                    "[class*='text'], [class*='number']"
-                )
-                or ""
-            ).strip()
-            if price and any(ch.isdigit() for ch in price):
-                return normalize_price_text(price)
-            last = price
-        except Exception:
-            pass
-        time.sleep(0.06)
-    price_final = normalize_price_text(last) or "未获取到价格"
-    log_debug(f"取价耗时 {(time.perf_counter() - t_price0)*1000:.0f}ms，结果 {price_final}")
+# 页面内取价函数库（供单次取价与“取价 + 取主图”合并脚本拼接复用）
+# waitPrice：价格区域 DOM 变化时立即复查（另以 50ms 定时兜底），取到含数字的价格即返回，超时返回最后一次结果；返回 Promise<文本>
+# 参数 s 为 _PRICE_SELECTORS（main/sym/alts/belt/wrap/node）
+_PRICE_JS_LIB = (
+    "function waitPrice(s, timeoutMs){\n"
+    "  function pickFromMain(){\n"
+    "    try{\n"
+    "      // 价格文本与货币符号合并为一次 querySelectorAll，按文档顺序各取首个匹配（与分别 querySelector 等价）\n"
+    "      var mainText = null, symbolEl = null;\n"
+    "      var hits = document.querySelectorAll(s.main + ', ' + s.sym);\n"
+    "      for (var h = 0; h < hits.length && !(mainText && symbolEl); h++){\n"
+    "        if (!mainText && hits[h].matches(s.main)) mainText = hits[h];\n"
+    "        if (!symbolEl && hits[h].matches(s.sym)) symbolEl = hits[h];\n"
+    "      }\n"
+    "      if (mainText && mainText.textContent){\n"
+    "        var sym = symbolEl && symbolEl.textContent ? symbolEl.textContent.trim() : '¥';\n"
+    "        var txt = mainText.textContent.trim();\n"
+    "        if (txt) return sym + txt;\n"
+    "      }\n"
+    "    }catch(e){}\n"
+    "    return '';\n"
+    "  }\n"
+    "  function pickFromAlts(){\n"
+    "    try{\n"
+    "      var alts = Array.isArray(s.alts) ? s.alts : [];\n"
+    "      for (var i=0; i<alts.length; i++){\n"
+    "        var el = document.querySelector(alts[i]);\n"
+    "        if (el && el.textContent){\n"
+    "          var t = el.textContent.trim();\n"
+    "          if (t){\n"
+    "            if (t.indexOf('¥') !== -1 || t.indexOf('￥') !== -1) return t;\n"
+    "            return '¥' + t;\n"
+    "          }\n"
+    "        }\n"
+    "      }\n"
+    "    }catch(e){}\n"
+    "    return '';\n"
+    "  }\n"
+    "  function pickFromBelt(){\n"
+    "    try{\n"
+    "      var belt = document.querySelector(s.belt);\n"
+    "      if (!belt) return '';\n"
+    "      var container = belt.querySelector(s.wrap) || belt;\n"
+    "      var nodes = container.querySelectorAll(s.node);\n"
+    "      for (var j=0; j<nodes.length; j++){\n"
+    "        var tt = (nodes[j].textContent || '').trim();\n"
+    "        if (tt && /\\d/.test(tt)){\n"
+    "          if (tt.indexOf('¥') !== -1 || tt.indexOf('￥') !== -1) return tt;\n"
+    "          return '¥' + tt;\n"
+    "        }\n"
+    "      }\n"
+    "    }catch(e){}\n"
+    "    return '';\n"
+    "  }\n"
+    "  var end = Date.now() + timeoutMs;\n"
+    "  return new Promise(function(resolve){\n"
+    "    var mo = null, timer = null, finished = false, queued = false;\n"
+    "    function finish(p){ if (finished) return; finished = true; if (mo) mo.disconnect(); clearTimeout(timer); resolve(p); }\n"
+    "    function check(){\n"
+    "      queued = false;\n"
+    "      if (finished) return;\n"
+    "      var p = '';\n"
+    "      try{ p = (pickFromMain() || pickFromAlts() || pickFromBelt() || '').trim(); }catch(e){}\n"
+    "      if ((p && /\\d/.test(p)) || Date.now() >= end) finish(p);\n"
+    "    }\n"
+    "    // DOM 变化时立即复查（同一轮变化合并为一次检查），不必等到下一个定时点\n"
+    "    try{\n"
+    "      mo = new MutationObserver(function(){ if (!queued){ queued = true; Promise.resolve().then(check); } });\n"
+    "      mo.observe(document.body || document.documentElement, {childList: true, subtree: true, characterData: true});\n"
+    "    }catch(e){ mo = null; }\n"
+    "    // 定时兜底：每 50ms 复查一次直至超时\n"
+    "    (function tick(){\n"
+    "      check();\n"
+    "      if (!finished) timer = setTimeout(tick, Math.max(0, Math.min(50, end - Date.now())));\n"
+    "    })();\n"
+    "  });\n"
+    "}\n"
+)
+# 取价页面内最长等待（ms）
+PRICE_TIMEOUT_MS = 300
+
+
+def _finish_price_text(price, t_price0: float) -> str:
+    """规范化页面返回的价格文本；无数字时返回“未获取到价格”（调试模式下记录耗时）。"""
+    price = normalize_price_text(price)
+    if any(ch.isdigit() for ch in price):
+        return price
+    price_final = price or "未获取到价格"
+    if debug_on():
+        log_debug(f"取价耗时 {(time.perf_counter() - t_price0)*1000:.0f}ms，结果 {price_final}")
     return price_final
 
 
-def get_main_image_url(driver) -> str:
+# 页面内主图读取函数库（供单次取图与画廊批量采集脚本拼接复用）
+# pickMainImage：按优先顺序提取一次主图 URL；waitMainImage：页面内每 20ms 检查一次，返回 Promise<URL>
+# 参数 s 为 _MAIN_IMAGE_SELECTORS（img/zoom/wrap/cands）
+_MAIN_IMAGE_JS_LIB = (
+    "function pickMainImage(imgSel, zoomSel, wrap, candSelectors){\n"
+    "  function isHttp(u){ try{ return typeof u === 'string' && /^https?:\\/\\//i.test(u); }catch(e){ return false; } }\n"
+    "  function tryZoomPreload(){\n"
+    "    try{\n"
+    "      if(!wrap) return;\n"
+    "      var rect = wrap.getBoundingClientRect();\n"
+    "      var cx = rect.left + rect.width * 0.6;\n"
+    "      var cy = rect.top + rect.height * 0.6;\n"
+    "      ['mouseenter','mouseover','mousemove'].forEach(function(tp){\n"
+    "        try{ wrap.dispatchEvent(new MouseEvent(tp, {bubbles:true, clientX: cx, clientY: cy, view: window})); }catch(e){}\n"
+    "      });\n"
+    "    }catch(e){}\n"
+    "  }\n"
+    "  function fromImg(img){\n"
+    "    if(!img) return '';\n"
+    "    try{ var u = img.currentSrc || ''; if(isHttp(u)) return u.trim(); }catch(e){}\n"
+    "    try{ var u2 = img.getAttribute('src') || ''; if(isHttp(u2)) return u2.trim(); }catch(e){}\n"
+    "    try{ var u3 = img.src || ''; if(isHttp(u3)) return u3.trim(); }catch(e){}\n"
+    "    try{\n"
+    "      var ss = img.getAttribute('srcset') || '';\n"
+    "      if(ss){ var first = ss.split(',')[0].trim().split(' ')[0].trim(); if(isHttp(first)) return first; }\n"
+    "    }catch(e){}\n"
+    "    try{\n"
+    "      var lazy = img.getAttribute('data-src') || img.getAttribute('data-original') || img.getAttribute('data-lazyload') || img.getAttribute('data-lazy') || img.getAttribute('data-srcset') || img.getAttribute('data-ks-lazyload') || img.getAttribute('placeholder') || '';\n"
+    "      if(isHttp(lazy)) return lazy.trim();\n"
+    "    }catch(e){}\n"
+    "    try{\n"
+    "      var pic = img.closest('picture');\n"
+    "      if (pic){\n"
+    "        var s = pic.querySelector('source[srcset]');\n"
+    "        if (s){ var ss2 = s.getAttribute('srcset') || ''; var first2 = ss2.split(',')[0].trim().split(' ')[0].trim(); if(isHttp(first2)) return first2; }\n"
+    "      }\n"
+    "    }catch(e){}\n"
+    "    return '';\n"
+    "  }\n"
+    "  function extractFromBg(bg){\n"
+    "    try{ if(!bg) return ''; }catch(e){ return ''; }\n"
+    "    var m = String(bg).match(/url\\([\"']?(.*?)[\"']?\\)/i);\n"
+    "    if (m && m[1]) return (m[1] || '').trim();\n"
+    "    return '';\n"
+    "  }\n"
+    "  // 1) 优先从主图 <img> 提取（兼容 srcset/懒加载占位符）\n"
+    "  try{\n"
+    "    var img = document.querySelector(imgSel);\n"
+    "    if (!img && wrap) img = wrap.querySelector('img');\n"
+    "    var u = fromImg(img);\n"
+    "    if (u) return u;\n"
+    "  }catch(e){}\n"
+    "  // 2) 兜底：取放大镜容器的背景图 URL（必要时尝试预加载）\n"
+    "  try{\n"
+    "    tryZoomPreload();\n"
+    "    var zoom = document.querySelector(zoomSel);\n"
+    "    if (zoom){\n"
+    "      var cs = window.getComputedStyle ? window.getComputedStyle(zoom) : null;\n"
+    "      var bg = (zoom.style && zoom.style.backgroundImage) || (cs && cs.backgroundImage) || '';\n"
+    "      var hi = extractFromBg(bg);\n"
+    "      if (isHttp(hi)) return hi;\n"
+    "    }\n"
+    "  }catch(e){}\n"
+    "  // 3) 进一步兜底：若主图区域自身使用 background-image\n"
+    "  try{\n"
+    "    if (wrap){\n"
+    "      var cs2 = window.getComputedStyle ? window.getComputedStyle(wrap) : null;\n"
+    "      var bg2 = (wrap.style && wrap.style.backgroundImage) || (cs2 && cs2.backgroundImage) || '';\n"
+    "      var hi2 = extractFromBg(bg2);\n"
+    "      if (isHttp(hi2)) return hi2;\n"
+    "    }\n"
+    "  }catch(e){}\n"
+    "  // 4) 最终兜底：在全局范围按序尝试候选选择器（由 Python 端 MAIN_IMAGE_FALLBACK_SELECTORS 传入）\n"
+    "  try{\n"
+    "    for (var k=0; k<candSelectors.length; k++){\n"
+    "      var nodes = document.querySelectorAll(candSelectors[k]);\n"
+    "      for (var i=0; i<nodes.length; i++){\n"
+    "        var u = fromImg(nodes[i]);\n"
+    "        if (isHttp(u)) return u;\n"
+    "      }\n"
+    "    }\n"
+    "  }catch(e){}\n"
+    "  // 5) meta/link 兜底：如 og:image / image_src\n"
+    "  try{\n"
+    "    var m = document.querySelector(\"meta[property='og:image']\") || document.querySelector(\"meta[name='og:image']\") || document.querySelector(\"meta[property='og:image:secure_url']\");\n"
+    "    if (m){ var c = m.getAttribute('content') || ''; if (isHttp(c)) return c; }\n"
+    "    var l = document.querySelector(\"link[rel='image_src']\");\n"
+    "    if (l){ var h = l.getAttribute('href') || ''; if (isHttp(h)) return h; }\n"
+    "  }catch(e){}\n"
+    "  return '';\n"
+    "}\n"
+    "function waitMainImage(s, timeoutMs, exclude){\n"
+    "  // 主图区域不在视口内时先滚动到视口中，增加懒加载触发概率（已可见则不滚动）\n"
+    "  try{\n"
+    "    var w0 = document.querySelector(s.wrap);\n"
+    "    if (w0){\n"
+    "      var r0 = w0.getBoundingClientRect();\n"
+    "      if (r0.bottom <= 0 || r0.top >= window.innerHeight) w0.scrollIntoView({block:'center',inline:'center'});\n"
+    "    }\n"
+    "  }catch(e){}\n"
+    "  // 页面内短轮询：等待主图区域图片URL可用（且与 exclude 不同）；超时返回最后一次 http 链接（可能等于 exclude）\n"
+    "  return new Promise(function(resolve){\n"
+    "    var end = Date.now() + timeoutMs;\n"
+    "    var lastHttp = '', last = '';\n"
+    "    (function tick(){\n"
+    "      var u = '';\n"
+    "      // 每轮只查询一次主图容器，并传给各个提取分支复用\n"
+    "      try{ u = (pickMainImage(s.img, s.zoom, document.querySelector(s.wrap), s.cands || []) || '').trim(); }catch(e){}\n"
+    "      // 兼容以 // 开头的协议相对地址\n"
+    "      if (u.indexOf('//') === 0) u = 'https:' + u;\n"
+    "      if (/^https?:\\/\\//i.test(u)){\n"
+    "        if (u !== exclude) return resolve(u);\n"
+    "        lastHttp = u;\n"
+    "      } else { last = u; }\n"
+    "      if (Date.now() >= end) return resolve(lastHttp || last);\n"
+    "      setTimeout(tick, 20);\n"
+    "    })();\n"
+    "  });\n"
+    "}\n"
+)
+
+
+# 单次取主图脚本（模块加载时拼接一次）
+_GET_MAIN_IMAGE_JS = (
+    "var done = arguments[arguments.length - 1];\n"
+    + _MAIN_IMAGE_JS_LIB +
+    "waitMainImage(arguments[0], arguments[1], arguments[2]).then(done, function(){ done(''); });"
+)
+
+
+def get_main_image_url(driver, timeout: float = 0.8, exclude: str = "") -> str:
     """获取当前“主图区域”展示图片的大图 URL（增强版）。
     说明：主图区域会在点击带图片的规格（如“颜色分类”）后展示该规格图，因此该链接通常为“规格图”，不一定是商品全局主图。
     优先顺序：
@@ -225,142 +385,33 @@ def get_main_image_url(driver) -> str:
     3) 主图区域 <img> 的 srcset/placeholder/data-src/data-ks-lazyload、<picture> 下 <source> 的 srcset
     4) 兜底：放大镜容器（.js-image-zoom__zoomed-image）的 background-image URL
     仅返回以 http/https 开头的链接，避免 data: 等占位符。
+    页面内每 20ms 检查一次，最多等待 timeout 秒；传入 exclude 时会等到链接与之不同（用于等待主图切换），
+    超时则返回最后取到的 http 链接（可能仍等于 exclude）。
     """
-    # 先尝试将主图区域滚动到视口中，增加懒加载触发概率
     try:
-        driver.execute_script(
-            "try{var w=document.querySelector(\"[class*='mainPicWrap']\"); if(w){w.scrollIntoView({block:'center',inline:'center'});} }catch(e){}"
-        )
+        last = (
+            driver.execute_async_script(_GET_MAIN_IMAGE_JS, _MAIN_IMAGE_SELECTORS, int(timeout * 1000), exclude or "") or ""
+        ).strip()
     except Exception:
-        pass
+        last = ""
+    return _finish_main_image_url(driver, last)
 
-    js = (
-        "return (function(imgSel, zoomSel){\n"
-        "  function isHttp(u){ try{ return typeof u === 'string' && /^https?:\\/\\//i.test(u); }catch(e){ return false; } }\n"
-        "  function tryZoomPreload(){\n"
-        "    try{\n"
-        "      var wrap = document.querySelector(\"[class*='mainPicWrap']\");\n"
-        "      if(!wrap) return;\n"
-        "      var rect = wrap.getBoundingClientRect();\n"
-        "      var cx = rect.left + rect.width * 0.6;\n"
-        "      var cy = rect.top + rect.height * 0.6;\n"
-        "      ['mouseenter','mouseover','mousemove'].forEach(function(tp){\n"
-        "        try{ wrap.dispatchEvent(new MouseEvent(tp, {bubbles:true, clientX: cx, clientY: cy, view: window})); }catch(e){}\n"
-        "      });\n"
-        "    }catch(e){}\n"
-        "  }\n"
-        "  function fromImg(img){\n"
-        "    if(!img) return '';\n"
-        "    try{ var u = img.currentSrc || ''; if(isHttp(u)) return u.trim(); }catch(e){}\n"
-        "    try{ var u2 = img.getAttribute('src') || ''; if(isHttp(u2)) return u2.trim(); }catch(e){}\n"
-        "    try{ var u3 = img.src || ''; if(isHttp(u3)) return u3.trim(); }catch(e){}\n"
-        "    try{\n"
-        "      var ss = img.getAttribute('srcset') || '';\n"
-        "      if(ss){ var first = ss.split(',')[0].trim().split(' ')[0].trim(); if(isHttp(first)) return first; }\n"
-        "    }catch(e){}\n"
-        "    try{\n"
-        "      var lazy = img.getAttribute('data-src') || img.getAttribute('data-original') || img.getAttribute('data-lazyload') || img.getAttribute('data-lazy') || img.getAttribute('data-srcset') || img.getAttribute('data-ks-lazyload') || img.getAttribute('placeholder') || '';\n"
-        "      if(isHttp(lazy)) return lazy.trim();\n"
-        "    }catch(e){}\n"
-        "    try{\n"
-        "      var pic = img.closest('picture');\n"
-        "      if (pic){\n"
-        "        var s = pic.querySelector('source[srcset]');\n"
-        "        if (s){ var ss2 = s.getAttribute('srcset') || ''; var first2 = ss2.split(',')[0].trim().split(' ')[0].trim(); if(isHttp(first2)) return first2; }\n"
-        "      }\n"
-        "    }catch(e){}\n"
-        "    return '';\n"
-        "  }\n"
-        "  function extractFromBg(bg){\n"
-        "    try{ if(!bg) return ''; }catch(e){ return ''; }\n"
-        "    var m = String(bg).match(/url\\([\"']?(.*?)[\"']?\\)/i);\n"
-        "    if (m && m[1]) return (m[1] || '').trim();\n"
-        "    return '';\n"
-        "  }\n"
-        "  // 1) 优先从主图 <img> 提取（兼容 srcset/懒加载占位符）\n"
-        "  try{\n"
-        "    var img = document.querySelector(imgSel);\n"
-        "    if (!img){ var wrap = document.querySelector(\"[class*='mainPicWrap']\"); if (wrap) img = wrap.querySelector('img'); }\n"
-        "    var u = fromImg(img);\n"
-        "    if (u) return u;\n"
-        "  }catch(e){}\n"
-        "  // 2) 兜底：取放大镜容器的背景图 URL（必要时尝试预加载）\n"
-        "  try{\n"
-        "    tryZoomPreload();\n"
-        "    var zoom = document.querySelector(zoomSel);\n"
-        "    if (zoom){\n"
-        "      var cs = window.getComputedStyle ? window.getComputedStyle(zoom) : null;\n"
-        "      var bg = (zoom.style && zoom.style.backgroundImage) || (cs && cs.backgroundImage) || '';\n"
-        "      var hi = extractFromBg(bg);\n"
-        "      if (isHttp(hi)) return hi;\n"
-        "    }\n"
-        "  }catch(e){}\n"
-        "  // 3) 进一步兜底：若主图区域自身使用 background-image\n"
-        "  try{\n"
-        "    var wrap2 = document.querySelector(\"[class*='mainPicWrap']\");\n"
-        "    if (wrap2){\n"
-        "      var cs2 = window.getComputedStyle ? window.getComputedStyle(wrap2) : null;\n"
-        "      var bg2 = (wrap2.style && wrap2.style.backgroundImage) || (cs2 && cs2.backgroundImage) || '';\n"
-        "      var hi2 = extractFromBg(bg2);\n"
-        "      if (isHttp(hi2)) return hi2;\n"
-        "    }\n"
-        "  }catch(e){}\n"
-        "  // 4) 最终兜底：在全局范围尝试若干候选选择器\n"
-        "  try{\n"
-        "    var candSelectors = [\n"
-        "      imgSel,\n"
-        "      \"[class*='mainPicWrap'] img\",\n"
-        "      \"img[src*='alicdn.com']\",\n"
-        "      \"img[src*='gw.alicdn.com']\",\n"
-        "      \"img[src*='/bao/uploaded/']\",\n"
-        "      \"img[src*='/imgextra/']\"\n"
-        "    ];\n"
-        "    var tried = new Set();\n"
-        "    for (var k=0; k<candSelectors.length; k++){\n"
-        "      var sel = candSelectors[k];\n"
-        "      if (tried.has(sel)) continue; tried.add(sel);\n"
-        "      var nodes = document.querySelectorAll(sel);\n"
-        "      for (var i=0; i<nodes.length; i++){\n"
-        "        var u = fromImg(nodes[i]);\n"
-        "        if (isHttp(u)) return u;\n"
-        "      }\n"
-        "    }\n"
-        "  }catch(e){}\n"
-        "  // 5) meta/link 兜底：如 og:image / image_src\n"
-        "  try{\n"
-        "    var m = document.querySelector(\"meta[property='og:image']\") || document.querySelector(\"meta[name='og:image']\") || document.querySelector(\"meta[property='og:image:secure_url']\");\n"
-        "    if (m){ var c = m.getAttribute('content') || ''; if (isHttp(c)) return c; }\n"
-        "    var l = document.querySelector(\"link[rel='image_src']\");\n"
-        "    if (l){ var h = l.getAttribute('href') || ''; if (isHttp(h)) return h; }\n"
-        "  }catch(e){}\n"
-        "  return '';\n"
-        "})(arguments[0], arguments[1]);"
-    )
-    # Python 端短轮询：等待主图区域图片URL在点击SKU后稳定可用（最多 ~0.8s）
-    end_time = time.perf_counter() + 0.8
-    last = ""
-    while time.perf_counter() < end_time:
-        try:
-            url = (
-                driver.execute_script(js, MAIN_PIC_IMG_SELECTOR, ZOOM_IMG_DIV_SELECTOR) or ""
-            ).strip()
-            # 兼容以 // 开头的协议相对地址
-            if url.startswith("//"):
-                url = "https:" + url
-            if url.startswith("http://") or url.startswith("https://"):
-                return url
-            last = url
-        except Exception as e:
-            last = ""
-        time.sleep(0.05)
-    # 若超时仍无 http 链接，输出详细调试信息
+
+def _finish_main_image_url(driver, last: str) -> str:
+    """仅接受 http/https 链接；否则返回空串，并在调试模式下额外采集主图区域信息写入日志。"""
+    if last.startswith("http://") or last.startswith("https://"):
+        return last
+    # 若超时仍无 http 链接，输出详细调试信息（仅调试模式下才额外采集，避免多一次脚本往返）
+    if not debug_on():
+        return ""
+    msgs: List[str] = []
+    if last:
+        msgs.append(f"主图区域图片URL候选(非http): {last}")
     try:
-        if last:
-            log_debug(f"主图区域图片URL候选(非http): {last}")
         dbg = driver.execute_script(
-            "return (function(imgSel, zoomSel){\n"
+            "return (function(imgSel, zoomSel, wrapSel){\n"
             "  try{\n"
-            "    var wrap=document.querySelector(\"[class*='mainPicWrap']\");\n"
+            "    var wrap=document.querySelector(wrapSel);\n"
             "    var img = wrap? wrap.querySelector('img') : document.querySelector(imgSel);\n"
             "    var zoom=document.querySelector(zoomSel);\n"
             "    var o=[];\n"
@@ -381,146 +432,163 @@ def get_main_image_url(driver) -> str:
             "    }\n"
             "    return o.join(' | ');\n"
             "  }catch(e){ return '调试收集异常'; }\n"
-            "})(arguments[0], arguments[1]);",
+            "})(arguments[0], arguments[1], arguments[2]);",
             MAIN_PIC_IMG_SELECTOR,
             ZOOM_IMG_DIV_SELECTOR,
+            MAIN_PIC_WRAP_SELECTOR,
         ) or ''
         if dbg:
-            log_debug(f"主图区域图片调试: {dbg}")
+            msgs.append(f"主图区域图片调试: {dbg}")
     except Exception:
         pass
-    return last if (last.startswith("http://") or last.startswith("https://")) else ""
+    log_debug_many(msgs)
+    return ""
+
+
+# 取价 + 取主图合并函数库：readPriceAndImage 返回 Promise<[价格, 主图URL]>，两者并行等待
+# 参数依次为 read_price_and_image_args() 的返回值；也供 traversal 与点击脚本拼接，做到“点击 + 读取”一次往返
+READ_PRICE_AND_IMAGE_JS_LIB = (
+    _PRICE_JS_LIB + _MAIN_IMAGE_JS_LIB +
+    "function readPriceAndImage(ps, pt, ims, it){\n"
+    "  return Promise.all([\n"
+    "    waitPrice(ps, pt).catch(function(){ return ''; }),\n"
+    "    waitMainImage(ims, it, '').catch(function(){ return ''; })\n"
+    "  ]).catch(function(){ return ['', '']; });\n"
+    "}\n"
+)
+
+# 取价 + 取主图合并脚本（模块加载时拼接一次）
+_READ_PRICE_AND_IMAGE_JS = (
+    "var done = arguments[arguments.length - 1];\n"
+    + READ_PRICE_AND_IMAGE_JS_LIB +
+    "readPriceAndImage(arguments[0], arguments[1], arguments[2], arguments[3]).then(done);"
+)
+
+
+def read_price_and_image_args(image_timeout: float = 0.8) -> list:
+    """readPriceAndImage 的参数：价格选择器、取价时限(ms)、主图选择器、取图时限(ms)。"""
+    return [_PRICE_SELECTORS, PRICE_TIMEOUT_MS, _MAIN_IMAGE_SELECTORS, int(image_timeout * 1000)]
+
+
+def finish_price_and_image(driver, price, image, t_price0: float) -> tuple[str, str]:
+    """规范化 readPriceAndImage 的结果（价格文本、仅接受 http/https 的主图链接）。"""
+    return _finish_price_text(price, t_price0), _finish_main_image_url(driver, (image or "").strip())
+
+
+def read_price_and_main_image(driver, image_timeout: float = 0.8) -> tuple[str, str]:
+    """一次页面脚本同时读取价格与主图 URL：两者的页面内轮询并行进行，耗时取两者较长者而非相加。
+    价格为规范化后的文本（取不到时为“未获取到价格”），主图仅接受 http/https 链接，取不到为空串。
+    """
+    t_price0 = time.perf_counter()
+    try:
+        price, image = driver.execute_async_script(
+            _READ_PRICE_AND_IMAGE_JS, *read_price_and_image_args(image_timeout)
+        ) or ["", ""]
+    except Exception:
+        price, image = "", ""
+    return finish_price_and_image(driver, price, image, t_price0)
+
+
+# 在页面内一次完成整个画廊采集（execute_async_script，仅一次往返）：
+# 取当前主图 → 逐个点击缩略图（跳过不含图片的项）→ 等待主图切换 → 按首次出现顺序去重
+# 参数：缩略图（区域内相对）选择器、缩略图区域选择器、全局缩略图选择器、主图选择器集合、最多处理的缩略图数（<0 表示不限）、总时限(ms)
+_COLLECT_GALLERY_JS = (
+    "var done = arguments[arguments.length - 1];\n"
+    "var itemSel = arguments[0], wrapSel = arguments[1], globalItemSel = arguments[2], sels = arguments[3], maxItems = arguments[4], budgetMs = arguments[5];\n"
+    + _MAIN_IMAGE_JS_LIB +
+    "var urls = [], seen = {};\n"
+    "// 缩略图项只在缩略图区域内查找，避免每轮对整个文档做后代子串匹配\n"
+    "function thumbItems(){\n"
+    "  var w = document.querySelector(wrapSel);\n"
+    "  return w ? w.querySelectorAll(itemSel) : document.querySelectorAll(globalItemSel);\n"
+    "}\n"
+    "function add(u){ if (/^https?:\\/\\//i.test(u || '') && !seen[u]){ seen[u] = 1; urls.push(u); return true; } return false; }\n"
+    "(async function(){\n"
+    "  var deadline = Date.now() + budgetMs;\n"
+    "  // 保底：先取当前展示的大图\n"
+    "  var last = await waitMainImage(sels, 800, '');\n"
+    "  add(last);\n"
+    "  var total = thumbItems().length;\n"
+    "  if (maxItems >= 0) total = Math.min(total, maxItems);\n"
+    "  for (var idx = 0; idx < total && Date.now() < deadline; idx++){\n"
+    "    // 缩略图为动态元素：每次按序号重新定位，规避旧节点\n"
+    "    var items = thumbItems();\n"
+    "    if (idx >= items.length) break;\n"
+    "    var item = items[idx];\n"
+    "    // 跳过非图片型缩略（如“参数”）\n"
+    "    if (!item.querySelector('img')) continue;\n"
+    "    // 页面内 el.click() 不要求元素可见，无需先滚动缩略图（主图区域的滚动由 waitMainImage 按需处理）\n"
+    "    try{ item.click(); }catch(e){ continue; }\n"
+    "    // 等待主图 URL 切换（最多 1s；未切换则得到当前链接，由去重过滤）\n"
+    "    var picked = await waitMainImage(sels, Math.max(0, Math.min(1000, deadline - Date.now())), last);\n"
+    "    if (add(picked)) last = picked;\n"
+    "  }\n"
+    "  done(urls);\n"
+    "})().catch(function(){ done(urls); });"
+)
 
 
 def collect_main_gallery_image_urls(driver, max_items: int | None = None) -> List[str]:
     """采集商品进入详情页时“主图画廊”的所有主图大图链接。
     实现策略：
       - 定位缩略图区域（包含匹配，以适配哈希类名变动）：`[class*='thumbnailsWrap']`
-      - 逐个点击缩略图项（优先点击其 `thumbnailItem` 容器），每次点击后读取 `get_main_image_url()` 返回的主图大图 URL；
+      - 逐个点击缩略图项（优先点击其 `thumbnailItem` 容器），每次点击后等待主图切换（与上一张不同）并读取大图 URL；
       - 按首次出现顺序去重，返回列表；
       - 若未找到缩略图区域，则至少返回当前主图区域图片（若可取到）。
+    以上全部在一次页面脚本中完成；若脚本失败，则退回为仅取当前主图。
     """
-    urls: List[str] = []
-    seen: set[str] = set()
-
-    # 保底：先尝试取当前展示的大图
     try:
-        cur = get_main_image_url(driver)
-        if cur and cur not in seen:
-            seen.add(cur)
-            urls.append(cur)
+        urls = driver.execute_async_script(
+            _COLLECT_GALLERY_JS,
+            THUMB_ITEM_IN_WRAP_SELECTOR,
+            THUMBS_WRAP_SELECTOR,
+            THUMB_ITEM_SELECTOR,
+            _MAIN_IMAGE_SELECTORS,
+            -1 if max_items is None else max(0, int(max_items)),
+            GALLERY_BUDGET_MS,
+        ) or []
+        return [str(u) for u in urls if u]
     except Exception:
         pass
 
     try:
-        # 将缩略图区域滚动到可视范围
-        try:
-            driver.execute_script(
-                "try{var w=document.querySelector(\"[class*='thumbnailsWrap']\"); if(w){w.scrollIntoView({block:'center',inline:'center'});} }catch(e){}"
-            )
-        except Exception:
-            pass
-
-        thumb_item_sel = "[class*='thumbnailsWrap'] [class*='thumbnailItem']"
-
-        # 获取所有缩略图项的数量（动态元素，后续每次点击前重取避免陈旧引用）
-        items = driver.find_elements(By.CSS_SELECTOR, thumb_item_sel)
-        total = len(items)
-        if max_items is not None:
-            total = min(total, max(0, int(max_items)))
-
-        last_url = urls[-1] if urls else ""
-        for idx in range(total):
-            try:
-                # 每次循环重新定位，规避 StaleElementReferenceException
-                items_now = driver.find_elements(By.CSS_SELECTOR, thumb_item_sel)
-                if idx >= len(items_now):
-                    break
-                item = items_now[idx]
-                try:
-                    # 跳过非图片型缩略（如“参数”）
-                    _ = item.find_element(By.CSS_SELECTOR, "img")
-                except Exception:
-                    continue
-                try:
-                    driver.execute_script("arguments[0].scrollIntoView({block:'center', inline:'center'});", item)
-                except Exception:
-                    pass
-                try:
-                    driver.execute_script("arguments[0].click();", item)
-                except Exception:
-                    try:
-                        item.click()
-                    except Exception:
-                        continue
-
-                # 等待主图 URL 切换并稳定
-                t_end = time.perf_counter() + 1.0
-                picked = ""
-                while time.perf_counter() < t_end:
-                    try:
-                        u = get_main_image_url(driver)
-                    except Exception:
-                        u = ""
-                    if u and u != last_url:
-                        picked = u
-                        break
-                    time.sleep(0.05)
-                if not picked:
-                    try:
-                        picked = get_main_image_url(driver)
-                    except Exception:
-                        picked = ""
-                if picked and picked not in seen:
-                    seen.add(picked)
-                    urls.append(picked)
-                    last_url = picked
-            except Exception:
-                continue
+        cur = get_main_image_url(driver)
+        return [cur] if cur else []
     except Exception:
-        pass
-
-    return urls
+        return []
 
 
-def _get_text_by_selector(driver, selector: str) -> str:
-    """通用：获取单个元素的文本（优先 title，其次 textContent）。失败返回空串。"""
+def _get_texts_by_selectors(driver, selectors: List[str]) -> List[str]:
+    """通用：一次脚本批量获取多个元素的文本（优先 title，其次 textContent）。失败的项返回空串。"""
     js = (
-        "return (function(sel){\n"
-        "  try{\n"
-        "    var el = document.querySelector(sel);\n"
-        "    if(!el) return '';\n"
-        "    var t = el.getAttribute('title') || el.textContent || '';\n"
-        "    return (t||'').trim();\n"
-        "  }catch(e){ return ''; }\n"
+        "return (function(sels){\n"
+        "  return sels.map(function(sel){\n"
+        "    try{\n"
+        "      var el = document.querySelector(sel);\n"
+        "      if(!el) return '';\n"
+        "      var t = el.getAttribute('title') || el.textContent || '';\n"
+        "      return (t||'').trim();\n"
+        "    }catch(e){ return ''; }\n"
+        "  });\n"
         "})(arguments[0]);"
     )
     try:
-        txt = driver.execute_script(js, PRODUCT_NAME_SELECTOR if selector is None else selector) or ""
-    except Exception:
-        txt = ""
-    try:
-        return str(txt).strip()
-    except Exception:
-        return ""
-
-
-def get_product_name(driver) -> str:
-    """获取商品名（基于元素示例选择器）；若失败返回“未知商品”。"""
-    try:
-        txt = _get_text_by_selector(driver, PRODUCT_NAME_SELECTOR)
-        return txt or "未知商品"
+        texts = driver.execute_script(js, list(selectors)) or []
     except Exception:
-        return "未知商品"
+        texts = []
+    out: List[str] = []
+    for i in range(len(selectors)):
+        try:
+            out.append(str(texts[i] or "").strip())
+        except Exception:
+            out.append("")
+    return out
 
 
-def get_shop_name(driver) -> str:
-    """获取店铺名（基于元素示例选择器）；若失败返回“未知店铺”。"""
-    try:
-        txt = _get_text_by_selector(driver, SHOP_NAME_SELECTOR)
-        return txt or "未知店铺"
-    except Exception:
-        return "未知店铺"
+def get_shop_and_product_name(driver) -> tuple[str, str]:
+    """一次脚本同时获取店铺名与商品名；失败分别返回“未知店铺”“未知商品”。"""
+    shop, product = _get_texts_by_selectors(driver, [SHOP_NAME_SELECTOR, PRODUCT_NAME_SELECTOR])
+    return shop or "未知店铺", product or "未知商品"
 
 
 def compute_total_combinations(sku_dimensions: List[SkuDimension]) -> int:
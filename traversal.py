@@ -2,18 +2,18 @@ import time
 import random
 import itertools
 from typing import List, Tuple
-from selenium.webdriver.common.by import By
 
-from common import log_debug, normalize_price_text, append_to_log
+from common import log_debug, debug_on, append_to_log
 from sku_utils import (
     SkuOption,
     SkuDimension,
     SKU_ITEM_SELECTOR,
     SKU_OPTION_SELECTOR,
-    get_price_text,
-    get_main_image_url,
-    is_selected_element,
-    read_current_selected_vids,
+    IS_SELECTED_JS,
+    READ_PRICE_AND_IMAGE_JS_LIB,
+    read_price_and_image_args,
+    finish_price_and_image,
+    read_price_and_main_image,
 )
 
 
@@ -25,73 +25,178 @@ def generate_all_combinations(sku_dimensions: List[SkuDimension]) -> List[Tuple[
 essential_float_delay = (0.02, 0.06)
 
 
-def ensure_combination_selected(driver, combination: List[SkuOption], last_selected_vids: List[str] | None = None) -> List[str]:
-    """按需点击组合中的 SKU 选项：仅对发生变化的维度执行点击；随后做一次快速校验，必要时补点。
-    返回本次目标组合的 vid 列表，供下次迭代复用，减少无效点击。
-    """
-    need_change_indices = list(range(len(combination)))
+# 页面内“按需点击 + 全量校验补点”函数库：selectCombination 返回 Promise<{failed: [维度序号...], error?: 文本}>
+# 参数：维度选择器、选项选择器、目标 vid 列表、需要变更的维度索引
+_SELECT_COMBINATION_JS_LIB = (
+    IS_SELECTED_JS +
+    "function selectCombination(itemSel, optSel, vids, changed){\n"
+    "  function queryOption(i){\n"
+    "    var items = document.querySelectorAll(itemSel);\n"
+    "    return i < items.length ? items[i].querySelector(optSel + '[data-vid=\"' + vids[i] + '\"]') : null;\n"
+    "  }\n"
+    "  function settled(i){ var cur = queryOption(i); return !!cur && isSelected(cur); }\n"
+    "  function clickAndSettle(el, i){\n"
+    "    // 点击后等到第 i 维选项呈选中态即继续，最多 300ms；不做轮询空转。\n"
+    "    // 页面可能在点击后重渲染/替换选项节点：监听整个 SKU 维度容器的子树（属性与增删节点），\n"
+    "    // 每次变化都按 data-vid 重新查询选项再判断选中态，而不是盯住点击前的旧节点\n"
+    "    return new Promise(function(resolve){\n"
+    "      var mo = null, timer = null;\n"
+    "      function finish(){ if (mo) mo.disconnect(); clearTimeout(timer); resolve(); }\n"
+    "      var box = (el.closest && el.closest(itemSel)) || document.querySelectorAll(itemSel)[i]\n"
+    "        || document.body || document.documentElement;\n"
+    "      try{\n"
+    "        mo = new MutationObserver(function(){ if (settled(i)) finish(); });\n"
+    "        mo.observe(box, {attributes: true, childList: true, subtree: true,\n"
+    "                         attributeFilter: ['class', 'aria-checked', 'data-selected']});\n"
+    "      }catch(e){ mo = null; }\n"
+    "      timer = setTimeout(finish, 300);\n"
+    "      el.click();\n"
+    "      // 同步生效时立即继续（仍让出一次事件循环，保证页面完成本轮更新）\n"
+    "      if (settled(i)){ clearTimeout(timer); timer = setTimeout(finish, 0); }\n"
+    "    });\n"
+    "  }\n"
+    "  function findOption(i){\n"
+    "    // 已存在则立即返回；点击上层维度后下层选项可能重渲染：监听 DOM 变化，出现即返回，最多等待 1s\n"
+    "    var el = queryOption(i);\n"
+    "    if (el) return Promise.resolve(el);\n"
+    "    return new Promise(function(resolve){\n"
+    "      var mo = null, timer = null;\n"
+    "      function finish(v){ if (mo) mo.disconnect(); clearTimeout(timer); resolve(v); }\n"
+    "      try{\n"
+    "        mo = new MutationObserver(function(){ var e = queryOption(i); if (e) finish(e); });\n"
+    "        mo.observe(document.body || document.documentElement, {childList: true, subtree: true});\n"
+    "      }catch(e){ mo = null; }\n"
+    "      timer = setTimeout(function(){ finish(queryOption(i)); }, 1000);\n"
+    "    });\n"
+    "  }\n"
+    "  return (async function(){\n"
+    "    var failed = [];\n"
+    "    // 首轮：只点击有变化的维度\n"
+    "    for (var k = 0; k < changed.length; k++){\n"
+    "      var el = await findOption(changed[k]);\n"
+    "      if (!el){ failed.push(changed[k] + 1); continue; }\n"
+    "      if (!isSelected(el)) await clickAndSettle(el, changed[k]);\n"
+    "    }\n"
+    "    // 校验：同步检查全部维度（不等待），全部已选中则直接返回；\n"
+    "    // 否则仅对未选中的维度补点，避免上层维度变化导致下层被反选\n"
+    "    var retry = [];\n"
+    "    for (var i = 0; i < vids.length; i++){\n"
+    "      if (failed.indexOf(i + 1) !== -1) continue;\n"
+    "      var cur = queryOption(i);\n"
+    "      if (!cur || !isSelected(cur)) retry.push(i);\n"
+    "    }\n"
+    "    for (var r = 0; r < retry.length; r++){\n"
+    "      var el2 = await findOption(retry[r]);\n"
+    "      if (el2 && !isSelected(el2)) await clickAndSettle(el2, retry[r]);\n"
+    "    }\n"
+    "    return {failed: failed};\n"
+    "  })().catch(function(e){ return {failed: [], error: String(e)}; });\n"
+    "}\n"
+)
+
+# 点击 + 取价 + 取主图合并脚本：点击完成后直接在页面内读取价格与主图，整个组合只需一次往返
+# 参数：前 4 个为 selectCombination 的参数，其后为 read_price_and_image_args() 的 4 个参数；回调返回 {failed, error?, price, image}
+# 函数库较大：首次执行时把组合后的函数以不可枚举属性挂到 window 上（不出现在 Object.keys(window) 等枚举中），
+# 之后只发送 _SELECT_AND_READ_STUB_JS 调用它；
+# 页面刷新后 window 上的函数丢失，stub 返回 {missing: true}，再发送一次完整脚本
+_SELECT_AND_READ_WINDOW_KEY = "__rpaSkuSelectAndRead"
+_SELECT_AND_READ_JS = (
+    "var done = arguments[arguments.length - 1], args = arguments;\n"
+    + _SELECT_COMBINATION_JS_LIB + READ_PRICE_AND_IMAGE_JS_LIB +
+    "var f = function(a, done){\n"
+    "  selectCombination(a[0], a[1], a[2], a[3]).then(function(sel){\n"
+    "    return readPriceAndImage(a[4], a[5], a[6], a[7]).then(function(r){\n"
+    "      done({failed: sel.failed, error: sel.error, price: r[0], image: r[1]});\n"
+    "    });\n"
+    "  }).catch(function(e){ done({failed: [], error: String(e), price: '', image: ''}); });\n"
+    "};\n"
+    "try{\n"
+    "  Object.defineProperty(window, '" + _SELECT_AND_READ_WINDOW_KEY + "', {value: f, enumerable: false, configurable: true, writable: true});\n"
+    "}catch(e){}\n"
+    "f(args, done);"
+)
+_SELECT_AND_READ_STUB_JS = (
+    "var done = arguments[arguments.length - 1];\n"
+    "var f = window['" + _SELECT_AND_READ_WINDOW_KEY + "'];\n"
+    "if (typeof f !== 'function') done({missing: true});\n"
+    "else f(arguments, done);"
+)
+
+
+def _need_change_indices(combination: List[SkuOption], last_selected_vids: List[str] | None) -> List[int]:
+    """与上次已选 vid 对比，返回需要点击的维度索引（无上次记录时为全部维度）。"""
     if last_selected_vids and len(last_selected_vids) == len(combination):
-        need_change_indices = [i for i, opt in enumerate(combination) if last_selected_vids[i] != opt.vid]
+        return [i for i, opt in enumerate(combination) if last_selected_vids[i] != opt.vid]
+    return list(range(len(combination)))
+
+
+def _report_select_result(res: dict) -> None:
+    """输出点击脚本返回的异常与失败维度。"""
+    if res.get("error"):
+        print(f"[警告] 点击SKU选项脚本异常: {res['error']}")
+    failed = res.get("failed") or []
+    if failed:
+        print(f"[警告] 点击维度{'、'.join(str(n) for n in failed)}选项失败: 未找到对应选项")
+
 
+def select_and_read_combination(
+    driver, combination: List[SkuOption], last_selected_vids: List[str] | None = None, image_timeout: float = 0.8
+) -> Tuple[List[str], str, str]:
+    """点击组合并读取价格与主图：点击、校验、取价、取图在页面内一个脚本中完成，整个组合只需一次 WebDriver 往返。
+    无需变更时直接读取价格与主图。返回 (本次组合的 vid 列表, 价格, 主图URL)。
+    """
+    vids = [opt.vid for opt in combination]
+    need_change_indices = _need_change_indices(combination, last_selected_vids)
     if not need_change_indices:
-        log_debug(f"点击SKU: 本次无需变更（沿用上次选择），维度索引 {list(range(len(combination)))}")
-        return [opt.vid for opt in combination]
+        if debug_on():
+            log_debug(f"点击SKU: 本次无需变更（沿用上次选择），维度索引 {list(range(len(combination)))}")
+        price, image_url = read_price_and_main_image(driver, image_timeout)
+        return vids, price, image_url
 
-    # 首轮：只点击有变化的维度
-    for dim_idx in need_change_indices:
-        option = combination[dim_idx]
-        try:
-            sku_items = driver.find_elements(By.CSS_SELECTOR, SKU_ITEM_SELECTOR)
-            current_dim = sku_items[dim_idx]
-            option_selector = f'{SKU_OPTION_SELECTOR}[data-vid="{option.vid}"]'
-            option_element = current_dim.find_element(By.CSS_SELECTOR, option_selector)
-            if not is_selected_element(option_element):
-                driver.execute_script("arguments[0].click();", option_element)
-                time.sleep(0.03)
-        except Exception as e:
-            print(f"[警告] 点击维度{dim_idx+1}选项失败: {e}")
-            continue
-
-    # 二次：对全部维度做一次快速校验与补点，避免上层维度变化导致下层被反选
+    t_price0 = time.perf_counter()
+    args = [SKU_ITEM_SELECTOR, SKU_OPTION_SELECTOR, vids, need_change_indices, *read_price_and_image_args(image_timeout)]
     try:
-        sku_items = driver.find_elements(By.CSS_SELECTOR, SKU_ITEM_SELECTOR)
-        for dim_idx, option in enumerate(combination):
-            current_dim = sku_items[dim_idx]
-            option_selector = f'{SKU_OPTION_SELECTOR}[data-vid="{option.vid}"]'
-            option_element = current_dim.find_element(By.CSS_SELECTOR, option_selector)
-            if not is_selected_element(option_element):
-                driver.execute_script("arguments[0].click();", option_element)
-                time.sleep(0.03)
-    except Exception:
-        pass
-
-    return [opt.vid for opt in combination]
+        res = driver.execute_async_script(_SELECT_AND_READ_STUB_JS, *args) or {}
+        if res.get("missing"):
+            res = driver.execute_async_script(_SELECT_AND_READ_JS, *args) or {}
+        _report_select_result(res)
+    except Exception as e:
+        print(f"[警告] 点击SKU选项失败: {e}")
+        res = {}
+    price, image_url = finish_price_and_image(driver, res.get("price"), res.get("image"), t_price0)
+    return vids, price, image_url
 
 
 def reorder_with_current_selected(driver, sku_dimensions: List[SkuDimension], combinations: List[Tuple[SkuOption, ...]]):
-    """将当前页面已选中的组合提前到第一个，并返回初始化的 last_selected_vids。"""
+    """将当前页面已选中的组合提前到第一个，并返回初始化的 last_selected_vids。
+    已选 vid 直接取自 parse_sku_dimensions 的解析结果（SkuDimension.selected_vid），不再额外读取页面。
+    """
     last_selected_vids: List[str] = []
     try:
-        current_vids = read_current_selected_vids(driver, len(sku_dimensions))
+        current_vids = [dim.selected_vid for dim in sku_dimensions]
         log_debug(f"当前已选VID: {current_vids}")
         if current_vids and len(current_vids) == len(sku_dimensions):
-            cur_opts: List[SkuOption] = []
+            # 每个维度按 vid 建一次“选项下标”字典，替代逐项 next() 线性查找
+            opt_indices: List[int] = []
             for i, dim in enumerate(sku_dimensions):
-                vid = current_vids[i]
-                if not vid:
-                    cur_opts = []
+                idx = {o.vid: j for j, o in enumerate(dim.options)}.get(current_vids[i]) if current_vids[i] else None
+                if idx is None:
+                    opt_indices = []
                     break
-                found = next((o for o in dim.options if o.vid == vid), None)
-                if not found:
-                    cur_opts = []
-                    break
-                cur_opts.append(found)
-            if cur_opts:
-                cur_tuple = tuple(cur_opts)
-                if cur_tuple in combinations:
-                    combinations = combinations[:]
-                    combinations.remove(cur_tuple)
-                    combinations.insert(0, cur_tuple)
+                opt_indices.append(idx)
+            if opt_indices:
+                cur_tuple = tuple(dim.options[j] for dim, j in zip(sku_dimensions, opt_indices))
+                # 组合按 itertools.product 顺序生成：按混合进制直接算出位置，校验不符时再退回线性查找
+                pos = 0
+                for dim, j in zip(sku_dimensions, opt_indices):
+                    pos = pos * len(dim.options) + j
+                if pos >= len(combinations) or combinations[pos] != cur_tuple:
+                    try:
+                        pos = combinations.index(cur_tuple)
+                    except ValueError:
+                        pos = -1
+                if pos >= 0:
+                    combinations = [cur_tuple] + combinations[:pos] + combinations[pos + 1:]
                     log_debug("已将当前已选组合置于遍历首位")
                     last_selected_vids = current_vids[:]
     except Exception as e:
@@ -134,13 +239,11 @@ def handle_single_combination(
 
         start_time = time.time()
         t_click_begin = time.perf_counter()
-        last_selected_vids = ensure_combination_selected(
+        # 点击与价格、主图读取在一次页面脚本中完成；价格已规范化（￥ 统一、去空白），此处不再重复处理
+        last_selected_vids, price, image_url = select_and_read_combination(
             driver, list(combination), last_selected_vids or None
         )
         t_click_end = time.perf_counter()
-        price = get_price_text(driver)
-        image_url = get_main_image_url(driver)
-        t_price_end = time.perf_counter()
         # 调试输出主图区域图片URL（通常为规格图），便于快速定位问题
         try:
             print(f"[图片] 链接: {image_url if image_url else '空'}")
@@ -153,11 +256,9 @@ def handle_single_combination(
         if not first_select_logged:
             first_select_logged = True
             log_debug(
-                f"首次选中耗时：点击 {(t_click_end - t_click_begin)*1000:.0f}ms；取价 {(t_price_end - t_click_end)*1000:.0f}ms；自页面就绪起 {(t_click_end - t_after_parse):.3f}s"
+                f"首次选中耗时：点击+取价 {(t_click_end - t_click_begin)*1000:.0f}ms；自页面就绪起 {(t_click_end - t_after_parse):.3f}s"
             )
 
-        price = normalize_price_text(price)
-
         # 结果行：各维度 + 隐藏图片链接 + 价格（Excel 不展示该隐藏列）
         result_row = [opt.text for opt in combination] + [image_url, price]
         print(f"[成功] 价格: {price}")